@@ -0,0 +1,93 @@
+import argparse
+import fnmatch
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+# The cases import the routers, which read settings on import; benchmarks never
+# talk to Telegram, so any token will do.
+os.environ.setdefault("TG_API_TOKEN", "0:benchmarks")
+
+from .runner import SAMPLES, compare, environment, measure, pin_cpu
+
+BASELINES = Path(__file__).parent / "baselines"
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="time every case")
+    run.add_argument("-k", "--filter", default="*", help="glob over case names, e.g. 'markup.*'")
+    run.add_argument("--samples", type=int, default=SAMPLES)
+    run.add_argument("--cpu", type=int, help="pin the process to this CPU")
+    run.add_argument("--output", help="write the results to this file")
+    run.add_argument("--save-baseline", metavar="NAME", help="store the results as benchmarks/baselines/NAME.json")
+
+    diff = commands.add_parser("compare", help="compare results against a baseline")
+    diff.add_argument("baseline", help="baseline name or path")
+    diff.add_argument("current", help="results file")
+    diff.add_argument("--threshold", type=float, default=0.10, help="relative slowdown that fails, default 0.10")
+
+    commands.add_parser("list", help="list case names")
+    return parser
+
+
+def _load(name_or_path: str) -> dict:
+    path = Path(name_or_path)
+    if not path.exists():
+        path = BASELINES / f"{name_or_path}.json"
+    return json.loads(path.read_text())
+
+
+def _run(args: argparse.Namespace) -> int:
+    from .cases import CASES
+
+    cpu = pin_cpu(args.cpu)
+    results = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "environment": environment(cpu),
+        "cases": {},
+    }
+    for name, factory in CASES.items():
+        if not fnmatch.fnmatch(name, args.filter):
+            continue
+        results["cases"][name] = stats = measure(factory(), samples=args.samples)
+        print(f"{name:<40}{stats['median_ns']:>11} ns  ±{stats['stdev_ns']}")
+
+    body = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(body)
+    if args.save_baseline:
+        BASELINES.mkdir(exist_ok=True)
+        (BASELINES / f"{args.save_baseline}.json").write_text(body)
+    return 0
+
+
+def _compare(args: argparse.Namespace) -> int:
+    baseline, current = _load(args.baseline), _load(args.current)
+    if baseline["environment"]["python"] != current["environment"]["python"]:
+        print("warning: baseline and results come from different Python versions", file=sys.stderr)
+    lines, regressions = compare(baseline, current, args.threshold)
+    print("\n".join(lines))
+    if regressions:
+        print(f"\n{len(regressions)} case(s) slower than {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+def main() -> int:
+    args = _parser().parse_args()
+    if args.command == "run":
+        return _run(args)
+    if args.command == "compare":
+        return _compare(args)
+    from .cases import CASES
+    print("\n".join(CASES))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+from datetime import datetime, timezone
+from typing import Callable
+
+from aiogram.types import Update
+
+from core.codecs import WIRE_FORMATS, get_wire_format
+from core.database import Card, CardStatus, SqlEndpointRepository, User
+from core.inmemory import AsyncRedisCache
+from core.scheduler import navigation_key
+from routers.user_router import _parse_cursor
+from template.markup import Markups
+from template.message import Messages
+from . import legacy
+
+# name -> factory building the zero-argument callable that is timed; setup cost
+# stays outside the measurement.
+CASES: dict[str, Callable[[], Callable[[], object]]] = {}
+
+
+def case(name: str):
+    def register(factory: Callable[[], Callable[[], object]]):
+        CASES[name] = factory
+        return factory
+    return register
+
+
+NOW = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def _user() -> User:
+    return User(
+        id=42,
+        telegram_id=123456789,
+        username="buyer",
+        balance=1500.0,
+        is_admin=False,
+        created_at=NOW,
+        updated_at=NOW,
+    )
+
+
+def _card() -> Card:
+    return Card(
+        id=1337,
+        owner_id=42,
+        title="Винтажная камера",
+        description="Плёночная камера в отличном состоянии, с чехлом и ремнём.",
+        price=2490.0,
+        photo_file_id="AgACAgIAAxkBAAIBZ2ZrV7b3xYz",
+        status=CardStatus.approved,
+        created_at=NOW,
+        updated_at=NOW,
+    )
+
+
+@case("markup.start_menu")
+def _():
+    return lambda: Markups.start_menu(is_admin=False)
+
+
+@case("markup.start_menu_admin")
+def _():
+    return lambda: Markups.start_menu(is_admin=True)
+
+
+@case("markup.user_cards_keyboard")
+def _():
+    card = _card()
+    return lambda: Markups.user_cards_keyboard(7, True, True, card, 250)
+
+
+@case("markup.admin_moderation_keyboard")
+def _():
+    card = _card()
+    return lambda: Markups.admin_moderation_keyboard(3, True, True, card)
+
+
+@case("markup.cancel_reply_kb")
+def _():
+    return Markups.cancel_reply_kb
+
+
+@case("message.start")
+def _():
+    return lambda: Messages.start("Анна")
+
+
+@case("message.format_card")
+def _():
+    card = _card()
+    return lambda: Messages.format_card(card.title, card.description, card.price, "seller", show_owner=True)
+
+
+@case("repo.serialize_user")
+def _():
+    user = _user()
+    return lambda: SqlEndpointRepository._serialize(user)
+
+
+@case("repo.deserialize_user")
+def _():
+    data = SqlEndpointRepository._serialize(_user())
+    return lambda: SqlEndpointRepository._deserialize(User, data)
+
+
+@case("repo.serialize_card")
+def _():
+    card = _card()
+    return lambda: SqlEndpointRepository._serialize(card)
+
+
+@case("repo.deserialize_card")
+def _():
+    data = SqlEndpointRepository._serialize(_card())
+    return lambda: SqlEndpointRepository._deserialize(Card, data)
+
+
+# The pre-codec path next to the current one: the same card serialized, encoded
+# for Redis and read back on a cache hit.
+@case("repo.serialize_card[legacy]")
+def _():
+    card = _card()
+    return lambda: legacy.serialize(card)
+
+
+@case("repo.deserialize_card[legacy]")
+def _():
+    data = legacy.serialize(_card())
+    return lambda: legacy.deserialize(Card, data)
+
+
+@case("cache.write_card[legacy]")
+def _():
+    card = _card()
+    return lambda: legacy.cache_dumps(legacy.serialize(card))
+
+
+@case("cache.hit_card[legacy]")
+def _():
+    raw = legacy.cache_dumps(legacy.serialize(_card()))
+    return lambda: legacy.deserialize(Card, legacy.cache_loads(raw))
+
+
+def _cache_cases(format_name: str) -> None:
+    def encode():
+        codec = AsyncRedisCache("redis://localhost", get_wire_format(format_name))._codec
+        data = SqlEndpointRepository._serialize(_card())
+        return lambda: codec.dumps(data)
+
+    def decode():
+        codec = AsyncRedisCache("redis://localhost", get_wire_format(format_name))._codec
+        raw = codec.dumps(SqlEndpointRepository._serialize(_card()))
+        return lambda: codec.loads(raw)
+
+    def write():
+        codec = AsyncRedisCache("redis://localhost", get_wire_format(format_name))._codec
+        card = _card()
+        return lambda: codec.dumps(SqlEndpointRepository._serialize(card))
+
+    def hit():
+        codec = AsyncRedisCache("redis://localhost", get_wire_format(format_name))._codec
+        raw = codec.dumps(SqlEndpointRepository._serialize(_card()))
+        return lambda: SqlEndpointRepository._deserialize(Card, codec.loads(raw))
+
+    CASES[f"cache.encode_card[{format_name}]"] = encode
+    CASES[f"cache.decode_card[{format_name}]"] = decode
+    CASES[f"cache.write_card[{format_name}]"] = write
+    CASES[f"cache.hit_card[{format_name}]"] = hit
+
+
+for _format in WIRE_FORMATS:
+    try:
+        get_wire_format(_format)
+    except ValueError:
+        # The optional package for this format is not installed here.
+        continue
+    _cache_cases(_format)
+
+
+@case("callback.parse_cursor")
+def _():
+    return lambda: _parse_cursor("user-cards_next-1337-7")
+
+
+@case("callback.parse_card_id")
+def _():
+    return lambda: int("user-buy-1337".split("-")[2])
+
+
+@case("callback.navigation_key")
+def _():
+    update = Update.model_validate({
+        "update_id": 1,
+        "callback_query": {
+            "id": "1",
+            "from": {"id": 123456789, "is_bot": False, "first_name": "Анна"},
+            "chat_instance": "1",
+            "data": "user-cards_next-1337-7",
+            "message": {"message_id": 10, "date": 0, "chat": {"id": 123456789, "type": "private"}, "text": ""},
+        },
+    })
+    return lambda: navigation_key(update)
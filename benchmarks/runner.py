@@ -0,0 +1,103 @@
+import gc
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Any, Callable, Optional
+
+# Fixed knobs so two runs differ only by the code under test: every sample is a
+# loop long enough to dwarf timer resolution, the loop count is calibrated once,
+# and the GC is off while a sample runs.
+WARMUP_SECONDS = 0.2
+SAMPLE_SECONDS = 0.1
+SAMPLES = 15
+
+
+def calibrate(func: Callable[[], object], sample_seconds: float) -> int:
+    loops = 1
+    while True:
+        elapsed = _sample(func, loops)
+        if elapsed >= sample_seconds:
+            return loops
+        loops = max(loops * 2, int(loops * sample_seconds / max(elapsed, 1e-9)))
+
+
+def _sample(func: Callable[[], object], loops: int) -> float:
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        return time.perf_counter() - started
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def measure(
+    func: Callable[[], object],
+    samples: int = SAMPLES,
+    sample_seconds: float = SAMPLE_SECONDS,
+    warmup_seconds: float = WARMUP_SECONDS,
+) -> dict[str, Any]:
+    loops = calibrate(func, sample_seconds)
+    deadline = time.perf_counter() + warmup_seconds
+    while time.perf_counter() < deadline:
+        _sample(func, loops)
+
+    per_call = [_sample(func, loops) / loops * 1e9 for _ in range(samples)]
+    return {
+        "loops": loops,
+        "median_ns": round(statistics.median(per_call), 1),
+        "min_ns": round(min(per_call), 1),
+        "stdev_ns": round(statistics.stdev(per_call), 1) if len(per_call) > 1 else 0.0,
+    }
+
+
+def pin_cpu(cpu: Optional[int]) -> Optional[int]:
+    # One core keeps the scheduler from migrating the loop mid-sample.
+    if cpu is None or not hasattr(os, "sched_setaffinity"):
+        return None
+    os.sched_setaffinity(0, {cpu})
+    return cpu
+
+
+def environment(cpu: Optional[int]) -> dict[str, Any]:
+    return {
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "pinned_cpu": cpu,
+        "hash_seed": os.environ.get("PYTHONHASHSEED"),
+    }
+
+
+def compare(
+    baseline: dict[str, Any],
+    current: dict[str, Any],
+    threshold: float,
+) -> tuple[list[str], list[str]]:
+    lines = [f"{'case':<40}{'baseline':>14}{'current':>14}{'change':>10}"]
+    regressions = []
+    for name in sorted(set(baseline["cases"]) | set(current["cases"])):
+        old = baseline["cases"].get(name)
+        new = current["cases"].get(name)
+        if old is None or new is None:
+            lines.append(f"{name:<40}{'only in ' + ('current' if old is None else 'baseline'):>38}")
+            continue
+        change = (new["median_ns"] - old["median_ns"]) / old["median_ns"]
+        mark = ""
+        # Noise of a sample is bounded by its spread; a change inside it is not a regression.
+        noise = max(old["stdev_ns"], new["stdev_ns"]) / old["median_ns"]
+        if change > threshold and change > noise:
+            mark = "  REGRESSION"
+            regressions.append(name)
+        elif change < -threshold and -change > noise:
+            mark = "  faster"
+        lines.append(
+            f"{name:<40}{old['median_ns']:>11} ns{new['median_ns']:>11} ns{change * 100:>+9.1f}%{mark}"
+        )
+    return lines, regressions
@@ -0,0 +1,221 @@
+import asyncio
+import time
+import uuid
+from typing import Any, Callable, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from misc import BotLogger
+from .database import User
+from .inmemory import AsyncRedisCache
+from .throttle import bulk_priority
+
+logger = BotLogger.get_logger("Broadcast")
+
+ProgressFormatter = Callable[[int, int, int, bool], str]
+
+
+class BroadcastEngine:
+    ACTIVE_KEY = "broadcast:active"
+    LOCK_KEY = "broadcast:lock"
+    LOCK_TTL = 120
+    # A broadcast nobody resumed within a day is dropped rather than kept forever.
+    STATE_TTL = 24 * 3600
+
+    def __init__(
+        self,
+        async_sessionmaker: async_sessionmaker[AsyncSession],
+        cache: AsyncRedisCache,
+        bot: Bot,
+        progress_formatter: ProgressFormatter,
+        chunk_size: int = 500,
+        concurrency: int = 20,
+        progress_interval: float = 5.0,
+    ) -> None:
+        self._async_sessionmaker = async_sessionmaker
+        self._cache = cache
+        self._bot = bot
+        self._progress_formatter = progress_formatter
+        self._chunk_size = chunk_size
+        self._concurrency = concurrency
+        self._progress_interval = progress_interval
+        self._lock_token = uuid.uuid4().hex
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _state_key(broadcast_id: str) -> str:
+        return f"broadcast:{broadcast_id}"
+
+    async def is_running(self) -> bool:
+        return await self._cache.get(self.ACTIVE_KEY) is not None
+
+    async def start(self, text: str, admin_chat_id: int, progress_message_id: int) -> Optional[str]:
+        if not await self._cache.acquire_lock(self.LOCK_KEY, self._lock_token, self.LOCK_TTL):
+            return None
+        # Holding the lock while a broadcast is marked active means its owner died;
+        # pick it up instead of leaving the admins locked out.
+        if await self._resume_locked():
+            return None
+
+        async with self._async_sessionmaker() as session:
+            total = await session.scalar(select(func.count(User.id))) or 0
+
+        broadcast_id = uuid.uuid4().hex
+        state = {
+            "id": broadcast_id,
+            "text": text,
+            "admin_chat_id": admin_chat_id,
+            "progress_message_id": progress_message_id,
+            "last_user_id": 0,
+            "total": total,
+            "sent": 0,
+            "failed": 0,
+            "finished": False,
+        }
+        await self._checkpoint(state)
+
+        self._task = asyncio.create_task(self._run(state))
+        return broadcast_id
+
+    async def resume(self) -> None:
+        # A restarted instance usually finds the crashed owner's lock still alive,
+        # so it keeps trying until the lock expires or another instance takes over.
+        while True:
+            try:
+                if not await self._cache.get(self.ACTIVE_KEY):
+                    return
+                if await self._cache.acquire_lock(self.LOCK_KEY, self._lock_token, self.LOCK_TTL):
+                    if not await self._resume_locked():
+                        await self._cache.release_lock(self.LOCK_KEY, self._lock_token)
+                    return
+            except Exception as e:
+                logger.error(f"Failed to check for a broadcast to resume: {e}")
+            await asyncio.sleep(self.LOCK_TTL / 3)
+
+    async def _resume_locked(self) -> bool:
+        active = await self._cache.get(self.ACTIVE_KEY)
+        if not active:
+            return False
+        state = await self._cache.get(self._state_key(active["id"]))
+        if not state or state.get("finished"):
+            await self._cache.delete(self.ACTIVE_KEY)
+            return False
+
+        logger.info(f"Resuming broadcast {state['id']} after user {state['last_user_id']}")
+        self._task = asyncio.create_task(self._run(state))
+        return True
+
+    async def _run(self, state: dict[str, Any]) -> None:
+        try:
+            await self._stream_holding_lock(state)
+            state["finished"] = True
+            await self._cache.delete(self.ACTIVE_KEY)
+            await self._cache.delete(self._state_key(state["id"]))
+            await self._report(state)
+            logger.info(f"Broadcast {state['id']} finished: sent={state['sent']} failed={state['failed']}")
+        except Exception as e:
+            logger.exception(f"Broadcast {state['id']} stopped: {e}")
+        finally:
+            await self._cache.release_lock(self.LOCK_KEY, self._lock_token)
+
+    async def _stream_holding_lock(self, state: dict[str, Any]) -> None:
+        # Bulk sends only get what interactive traffic leaves of the Bot API rate, so
+        # a chunk may take longer than the lock TTL; the lock is kept alive on its own.
+        heartbeat = asyncio.create_task(self._hold_lock())
+        stream = asyncio.create_task(self._stream(state))
+        try:
+            await asyncio.wait({heartbeat, stream}, return_when=asyncio.FIRST_COMPLETED)
+            if not stream.done():
+                stream.cancel()
+                await asyncio.gather(stream, return_exceptions=True)
+                raise RuntimeError("Broadcast lock lost")
+            await stream
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+            if not stream.done():
+                stream.cancel()
+
+    async def _hold_lock(self) -> None:
+        while True:
+            await asyncio.sleep(self.LOCK_TTL / 3)
+            if not await self._cache.refresh_lock(self.LOCK_KEY, self._lock_token, self.LOCK_TTL):
+                return
+
+    async def _stream(self, state: dict[str, Any]) -> None:
+        queue: asyncio.Queue[int] = asyncio.Queue(maxsize=self._chunk_size)
+        workers = [asyncio.create_task(self._worker(queue, state)) for _ in range(self._concurrency)]
+        last_report = 0.0
+
+        try:
+            while True:
+                # A short session per page: the checkpoint already holds the cursor, so
+                # no connection or snapshot has to outlive a chunk.
+                async with self._async_sessionmaker() as session:
+                    result = await session.execute(
+                        select(User.id, User.telegram_id)
+                        .where(User.id > state["last_user_id"])
+                        .order_by(User.id)
+                        .limit(self._chunk_size)
+                    )
+                    chunk = result.all()
+                if not chunk:
+                    break
+
+                for row in chunk:
+                    await queue.put(row.telegram_id)
+                await queue.join()
+
+                # Progress only moves past a chunk once every send in it settled,
+                # so a resumed broadcast repeats at most one chunk.
+                state["last_user_id"] = chunk[-1].id
+                await self._checkpoint(state)
+
+                if time.monotonic() - last_report >= self._progress_interval:
+                    last_report = time.monotonic()
+                    await self._report(state)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _worker(self, queue: "asyncio.Queue[int]", state: dict[str, Any]) -> None:
+        while True:
+            telegram_id = await queue.get()
+            try:
+                if await self._deliver(telegram_id, state["text"]):
+                    state["sent"] += 1
+                else:
+                    state["failed"] += 1
+            finally:
+                queue.task_done()
+
+    async def _deliver(self, telegram_id: int, text: str) -> bool:
+        try:
+            with bulk_priority():
+                await self._bot.send_message(chat_id=telegram_id, text=text)
+            return True
+        except (TelegramForbiddenError, TelegramBadRequest):
+            return False
+        except Exception as e:
+            logger.error(f"Broadcast delivery to {telegram_id} failed: {e}")
+            return False
+
+    async def _checkpoint(self, state: dict[str, Any]) -> None:
+        await self._cache.set(self._state_key(state["id"]), state, ttl=self.STATE_TTL)
+        await self._cache.set(self.ACTIVE_KEY, {"id": state["id"]}, ttl=self.STATE_TTL)
+
+    async def _report(self, state: dict[str, Any]) -> None:
+        try:
+            await self._bot.edit_message_text(
+                text=self._progress_formatter(state["sent"], state["failed"], state["total"], state["finished"]),
+                chat_id=state["admin_chat_id"],
+                message_id=state["progress_message_id"],
+            )
+        except TelegramBadRequest:
+            pass
+        except Exception as e:
+            logger.error(f"Failed to report broadcast progress: {e}")
@@ -0,0 +1,175 @@
+import enum
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Type, TypeVar
+
+from sqlalchemy import DateTime, Enum as SAEnum
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+T = TypeVar("T")
+
+Converter = Optional[Callable[[Any], Any]]
+
+
+def _encode_enum(value: Any) -> Any:
+    return value.value if isinstance(value, enum.Enum) else value
+
+
+def _encode_datetime(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _decode_datetime(value: Any) -> Any:
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+class EntityCodec:
+
+    def __init__(self, entity_class: Type[T]) -> None:
+        self.entity_class = entity_class
+        self._fields: list[tuple[str, Converter, Converter]] = []
+        for column in entity_class.__table__.columns:
+            encode: Converter = None
+            decode: Converter = None
+            if isinstance(column.type, SAEnum) and column.type.enum_class is not None:
+                encode = _encode_enum
+                decode = column.type.enum_class
+            elif isinstance(column.type, DateTime):
+                encode = _encode_datetime
+                decode = _decode_datetime
+            self._fields.append((column.name, encode, decode))
+
+    def encode(self, obj: Any) -> Dict[str, Any]:
+        data: Dict[str, Any] = {}
+        for name, encode, _ in self._fields:
+            value = getattr(obj, name)
+            if encode is not None and value is not None:
+                value = encode(value)
+            data[name] = value
+        return data
+
+    def decode(self, data: Dict[str, Any]) -> Any:
+        kwargs: Dict[str, Any] = {}
+        for name, _, decode in self._fields:
+            value = data.get(name)
+            if decode is not None and value is not None:
+                value = decode(value)
+            kwargs[name] = value
+        return self.entity_class(**kwargs)
+
+
+_codecs: Dict[type, EntityCodec] = {}
+
+
+def register_codecs(*entity_classes: type) -> None:
+    for entity_class in entity_classes:
+        _codecs[entity_class] = EntityCodec(entity_class)
+
+
+def codec_for(entity_class: type) -> EntityCodec:
+    codec = _codecs.get(entity_class)
+    if codec is None:
+        codec = _codecs[entity_class] = EntityCodec(entity_class)
+    return codec
+
+
+class WireFormat:
+    # Every payload starts with "<tag>:" so readers can tell formats apart and a
+    # format change never misreads entries written by an older deployment.
+    tag: bytes = b""
+
+    def dumps(self, value: Dict[str, Any]) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, body: bytes) -> Any:
+        raise NotImplementedError
+
+
+class JsonFormat(WireFormat):
+    tag = b"j1"
+
+    def dumps(self, value: Dict[str, Any]) -> bytes:
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, body: bytes) -> Any:
+        return json.loads(body)
+
+
+class OrjsonFormat(WireFormat):
+    tag = b"o1"
+
+    def dumps(self, value: Dict[str, Any]) -> bytes:
+        return orjson.dumps(value)
+
+    def loads(self, body: bytes) -> Any:
+        return orjson.loads(body)
+
+
+class MsgpackFormat(WireFormat):
+    tag = b"m1"
+
+    def dumps(self, value: Dict[str, Any]) -> bytes:
+        return msgpack.packb(value, use_bin_type=True)
+
+    def loads(self, body: bytes) -> Any:
+        return msgpack.unpackb(body, raw=False)
+
+
+WIRE_FORMATS: Dict[str, Callable[[], WireFormat]] = {
+    "json": JsonFormat,
+    "orjson": OrjsonFormat,
+    "msgpack": MsgpackFormat,
+}
+
+_AVAILABLE = {
+    "json": True,
+    "orjson": orjson is not None,
+    "msgpack": msgpack is not None,
+}
+
+
+def get_wire_format(name: str) -> WireFormat:
+    if name not in WIRE_FORMATS:
+        raise ValueError(f"Unknown cache wire format: {name}")
+    if not _AVAILABLE[name]:
+        raise ValueError(f"Cache wire format {name!r} requires the {name} package")
+    return WIRE_FORMATS[name]()
+
+
+class PayloadCodec:
+
+    def __init__(self, wire_format: Optional[WireFormat] = None) -> None:
+        self._writer = wire_format or JsonFormat()
+        self._readers: Dict[bytes, WireFormat] = {
+            fmt_cls.tag: fmt_cls()
+            for name, fmt_cls in WIRE_FORMATS.items()
+            if _AVAILABLE[name]
+        }
+        # orjson payloads are plain JSON, so they stay readable without orjson installed.
+        self._readers.setdefault(OrjsonFormat.tag, JsonFormat())
+        self._readers[self._writer.tag] = self._writer
+
+    def dumps(self, value: Dict[str, Any]) -> bytes:
+        return self._writer.tag + b":" + self._writer.dumps(value)
+
+    def loads(self, raw: bytes | str) -> Optional[Dict[str, Any]]:
+        if isinstance(raw, str):
+            raw = raw.encode("utf-8")
+        tag, sep, body = raw.partition(b":")
+        reader = self._readers.get(tag) if sep else None
+        try:
+            if reader is None:
+                # Untagged entries were written by the plain-JSON cache before versioning.
+                return json.loads(raw)
+            return reader.loads(body)
+        except (ValueError, TypeError):
+            return None
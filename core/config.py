@@ -16,6 +16,14 @@ class Settings(BaseSettings):
 
     tg_api_token: str = Field(default=...)
     payment_provider_token: str = Field(default="TEST_PROVIDER_TOKEN")
+    telegram_api_base: str = Field(default="")
+
+    bot_transport: Literal["polling", "webhook"] = Field(default="polling")
+    webhook_base_url: str = Field(default="")
+    webhook_path: str = Field(default="/telegram/webhook")
+    webhook_secret: str = Field(default="")
+    webhook_host: str = Field(default="0.0.0.0")
+    webhook_port: int = Field(default=8080)
 
     postgres_host: str = Field(default="postgres")
     postgres_port: int = Field(default=5432)
@@ -27,6 +35,55 @@ class Settings(BaseSettings):
     redis_port: int = Field(default=6379)
     redis_db: int = Field(default=0)
 
+    redis_op_timeout: float = Field(default=0.1)
+    redis_breaker_failure_threshold: int = Field(default=5)
+    redis_breaker_reset_timeout: float = Field(default=10.0)
+
+    negative_cache_ttl: int = Field(default=30)
+    cache_wire_format: Literal["json", "orjson", "msgpack"] = Field(default="json")
+
+    l1_cache_enabled: bool = Field(default=False)
+    l1_cache_max_size: int = Field(default=10_000)
+    l1_cache_ttl: float = Field(default=30.0)
+
+    fsm_ttl: int = Field(default=7 * 24 * 3600)
+
+    admin_roles_refresh_interval: int = Field(default=60)
+    approved_counter_reconcile_interval: int = Field(default=300)
+    ledger_fold_interval: float = Field(default=5.0)
+    ledger_fold_batch_size: int = Field(default=1000)
+
+    outbox_batch_size: int = Field(default=50)
+    outbox_poll_interval: float = Field(default=2.0)
+    outbox_max_attempts: int = Field(default=8)
+
+    bot_api_global_rate: float = Field(default=30.0)
+    bot_api_chat_rate: float = Field(default=1.0)
+    bot_api_chat_burst: int = Field(default=3)
+    bot_api_group_rate: float = Field(default=20 / 60)
+    bot_api_max_retries: int = Field(default=3)
+
+    broadcast_chunk_size: int = Field(default=500)
+    broadcast_concurrency: int = Field(default=20)
+
+    update_concurrency: int = Field(default=64)
+    update_user_queue_size: int = Field(default=5)
+    update_max_pending: int = Field(default=2000)
+
+    bot_mode: Literal["standalone", "sharded"] = Field(default="standalone")
+    stream_shards: int = Field(default=16)
+    stream_workers: int = Field(default=4)
+    stream_node_index: int = Field(default=0)
+    stream_node_count: int = Field(default=1)
+    stream_maxlen: int = Field(default=100_000)
+    stream_batch_size: int = Field(default=50)
+    stream_max_in_flight: int = Field(default=200)
+
+    metrics_port: int = Field(default=9000)
+
+    update_record_path: str = Field(default="")
+    update_record_salt: str = Field(default="")
+
     log_level: LOG_LEVEL_LITERAL = Field(default="INFO")
 
     @property
@@ -0,0 +1,54 @@
+import asyncio
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from misc import BotLogger
+from .database import Card, CardStatus
+from .inmemory import AsyncRedisCache
+
+logger = BotLogger.get_logger("Counters")
+
+
+class ApprovedCardsCounter:
+    KEY = "cards:approved:count"
+
+    def __init__(
+        self,
+        async_sessionmaker: async_sessionmaker[AsyncSession],
+        cache: AsyncRedisCache,
+        reconcile_interval: int = 300,
+    ) -> None:
+        self._async_sessionmaker = async_sessionmaker
+        self._cache = cache
+        self._reconcile_interval = reconcile_interval
+
+    async def get(self) -> int:
+        value = await self._cache.get_counter(self.KEY)
+        if value is None:
+            value = await self.reconcile()
+        return max(value, 0)
+
+    async def incr(self, amount: int = 1) -> None:
+        # A missing key is left missing: the next get() recounts from Postgres.
+        await self._cache.incr_existing(self.KEY, amount)
+
+    async def decr(self, amount: int = 1) -> None:
+        await self._cache.incr_existing(self.KEY, -amount)
+
+    async def reconcile(self) -> int:
+        async with self._async_sessionmaker() as session:
+            result = await session.execute(
+                select(func.count(Card.id)).where(Card.status == CardStatus.approved)
+            )
+            value = result.scalar() or 0
+        await self._cache.set_counter(self.KEY, value)
+        return value
+
+    async def run_reconciler(self) -> None:
+        while True:
+            await asyncio.sleep(self._reconcile_interval)
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.error(f"Failed to reconcile approved cards counter: {e}")
@@ -1,6 +1,7 @@
+import asyncio
 import enum
 from datetime import datetime, timezone
-from typing import Type, TypeVar, Optional, Any, Dict
+from typing import Type, TypeVar, Optional, Any, Awaitable, Callable, Dict, Iterable
 from sqlalchemy import (
     Column,
     BigInteger,
@@ -14,10 +15,13 @@ from sqlalchemy import (
     select,
     func
 )
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base, relationship
 
+from .codecs import codec_for, register_codecs
 from .inmemory import AsyncRedisCache
+from .uow import UnitOfWork
 
 T = TypeVar("T")
 Base = declarative_base()
@@ -35,6 +39,18 @@ class WithdrawStatus(str, enum.Enum):
     completed = "completed"
 
 
+class OutboxStatus(str, enum.Enum):
+    pending = "pending"
+    failed = "failed"
+
+
+class LedgerEntryKind(str, enum.Enum):
+    purchase = "purchase"
+    sale = "sale"
+    withdrawal = "withdrawal"
+    topup = "topup"
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -111,6 +127,34 @@ class WithdrawRequest(Base):
     user = relationship("User", back_populates="withdraw_requests")
 
 
+class BalanceLedgerEntry(Base):
+    __tablename__ = "balance_ledger"
+
+    id = Column(BigInteger, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    amount = Column(Float, nullable=False)
+    kind = Column(SAEnum(LedgerEntryKind), nullable=False)
+    reference_id = Column(Integer, nullable=True)
+    folded = Column(Boolean, default=False, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+
+class OutboxMessage(Base):
+    __tablename__ = "notification_outbox"
+
+    id = Column(BigInteger, primary_key=True)
+    chat_id = Column(BigInteger, nullable=False)
+    text = Column(String, nullable=False)
+    status = Column(SAEnum(OutboxStatus), default=OutboxStatus.pending, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+
+register_codecs(User, Card, Purchase, WithdrawRequest, BalanceLedgerEntry, OutboxMessage)
+
+
 class Database:
     _instance: Optional["Database"] = None
 
@@ -133,84 +177,214 @@ class Database:
         return cls._instance
 
     async def init_db(self) -> None:
-        async with self.engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
+        from .migrations import MigrationRunner
 
+        await MigrationRunner(self.engine).run()
 
-class SqlEndpointRepository:
 
-    def __init__(self, async_sessionmaker: async_sessionmaker[AsyncSession], cache: AsyncRedisCache):
+class SqlEndpointRepository:
+    # Stored under an entity key for a short while after a lookup found nothing.
+    MISSING = {"__missing__": True}
+
+    def __init__(
+        self,
+        async_sessionmaker: async_sessionmaker[AsyncSession],
+        cache: AsyncRedisCache,
+        negative_ttl: int = 30,
+    ):
         self._async_sessionmaker = async_sessionmaker
         self._cache = cache
+        self._negative_ttl = negative_ttl
+        self._inflight: Dict[str, asyncio.Future] = {}
 
     async def get_by_id(self, entity_class: Type[T], entity_id: int) -> Optional[T]:
         key = f"{entity_class.__tablename__}:{entity_id}"
         cached = await self._cache.get(key)
         if cached:
-            return self._deserialize(entity_class, cached)
+            return None if self._is_missing(cached) else self._deserialize(entity_class, cached)
+
+        data = await self._single_flight(key, lambda: self._load_by_id(entity_class, entity_id, key))
+        return self._deserialize(entity_class, data) if data else None
+
+    async def get_many_by_ids(
+        self,
+        entity_class: Type[T],
+        entity_ids: Iterable[int],
+        uow: Optional[UnitOfWork] = None,
+    ) -> Dict[int, T]:
+        keys = {f"{entity_class.__tablename__}:{entity_id}": entity_id for entity_id in dict.fromkeys(entity_ids)}
+        cached = await self._cache.get_many(list(keys))
+
+        found: Dict[int, T] = {
+            keys[key]: self._deserialize(entity_class, data)
+            for key, data in cached.items()
+            if not self._is_missing(data)
+        }
+        missing = [entity_id for key, entity_id in keys.items() if key not in cached]
+        if missing:
+            query = select(entity_class).where(entity_class.id.in_(missing))
+            if uow is not None:
+                session = await uow.session()
+                loaded = (await session.execute(query)).scalars().all()
+            else:
+                async with self._async_sessionmaker() as session:
+                    loaded = (await session.execute(query)).scalars().all()
+            found.update((obj.id, obj) for obj in loaded)
+
+            items = {f"{entity_class.__tablename__}:{obj.id}": self._serialize(obj) for obj in loaded}
+            absent = {
+                f"{entity_class.__tablename__}:{entity_id}": self.MISSING
+                for entity_id in missing
+                if entity_id not in found
+            }
+
+            async def fill() -> None:
+                await self._cache.set_many(
+                    {**items, **absent},
+                    ttls={key: self._negative_ttl for key in absent},
+                )
+
+            if uow is not None:
+                # The rows may include the update's own uncommitted writes.
+                uow.on_commit(fill)
+            else:
+                await fill()
+
+        return {entity_id: found[entity_id] for entity_id in keys.values() if entity_id in found}
+
+    async def upsert(self, entity: Any, uow: Optional[UnitOfWork] = None) -> Any:
+        if uow is not None:
+            # Joins the update's transaction; the cache only sees the row once it commits.
+            session = await uow.session()
+            session.add(entity)
+            await session.flush()
+            uow.on_commit(lambda: self._cache_entity(entity))
+            return entity
 
-        async with self._async_sessionmaker() as session:
-            obj = await session.get(entity_class, entity_id)
-            if obj:
-                await self._cache.set(key, self._serialize(obj))
-            return obj
-
-    async def upsert(self, entity: Any) -> Any:
         async with self._async_sessionmaker() as session:
             async with session.begin():
                 session.add(entity)
                 await session.flush()
-                key = f"{entity.__tablename__}:{entity.id}"
-                await self._cache.set(key, self._serialize(entity))
+        await self._cache_entity(entity)
         return entity
 
     async def delete(self, entity: Any) -> None:
-        key = f"{entity.__tablename__}:{entity.id}"
-        await self._cache.delete(key)
+        await self.invalidate(type(entity), entity.id)
+        if isinstance(entity, User):
+            await self._cache.delete(self._telegram_index_key(entity.telegram_id))
 
         async with self._async_sessionmaker() as session:
             async with session.begin():
                 await session.delete(entity)
 
+    async def invalidate(self, entity_class: Type[Any], entity_id: int) -> None:
+        await self._cache.delete(f"{entity_class.__tablename__}:{entity_id}")
+
     async def get_user_by_telegram_id(self, telegram_id: int) -> Optional[User]:
+        index_key = self._telegram_index_key(telegram_id)
+        ref = await self._cache.get(index_key)
+        if ref:
+            if self._is_missing(ref):
+                return None
+            cached = await self._cache.get(f"{User.__tablename__}:{ref['id']}")
+            if cached and cached.get("telegram_id") == telegram_id:
+                return self._deserialize(User, cached)
+
+        data = await self._single_flight(index_key, lambda: self._load_by_telegram_id(telegram_id, index_key))
+        return self._deserialize(User, data) if data else None
+
+    async def register_user(self, telegram_id: int, username: Optional[str]) -> tuple[User, bool]:
+        user = await self.get_user_by_telegram_id(telegram_id)
+        if user is not None:
+            return user, False
+
+        # ON CONFLICT keeps two first updates from the same person racing into a
+        # unique violation; the loser simply reads the row the winner inserted.
+        now = datetime.now(timezone.utc)
+        async with self._async_sessionmaker() as session:
+            async with session.begin():
+                user_id = await session.scalar(
+                    pg_insert(User)
+                    .values(telegram_id=telegram_id, username=username, created_at=now, updated_at=now)
+                    .on_conflict_do_nothing(index_elements=[User.telegram_id])
+                    .returning(User.id)
+                )
+
+        if user_id is None:
+            await self._cache.delete(self._telegram_index_key(telegram_id))
+            return await self.get_user_by_telegram_id(telegram_id), False
+
+        user = User(
+            id=user_id,
+            telegram_id=telegram_id,
+            username=username,
+            balance=0.0,
+            is_admin=False,
+            created_at=now,
+            updated_at=now,
+        )
+        await self._cache_entity(user)
+        return user, True
+
+    async def _load_by_id(self, entity_class: Type[T], entity_id: int, key: str) -> Optional[Dict[str, Any]]:
+        async with self._async_sessionmaker() as session:
+            obj = await session.get(entity_class, entity_id)
+        if obj is None:
+            await self._remember_missing(key)
+            return None
+        data = self._serialize(obj)
+        await self._cache.set(key, data)
+        return data
+
+    async def _load_by_telegram_id(self, telegram_id: int, index_key: str) -> Optional[Dict[str, Any]]:
         async with self._async_sessionmaker() as session:
             result = await session.execute(
                 select(User).where(User.telegram_id == telegram_id)
             )
             user = result.scalars().first()
-            if user:
-                key = f"{User.__tablename__}:{user.id}"
-                await self._cache.set(key, self._serialize(user))
-            return user
+        if user is None:
+            await self._remember_missing(index_key)
+            return None
+        await self._cache_entity(user)
+        return self._serialize(user)
+
+    async def _single_flight(
+        self,
+        key: str,
+        load: Callable[[], Awaitable[Optional[Dict[str, Any]]]],
+    ) -> Optional[Dict[str, Any]]:
+        # Concurrent misses on one key share a single load. Callers get the plain
+        # dict and build their own instance, so nobody shares a mutable entity.
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(load())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # A cancelled caller must not cancel the load the others are waiting on.
+        return await asyncio.shield(future)
+
+    async def _remember_missing(self, key: str) -> None:
+        # NX so a marker from a slow lookup never shadows a row cached by a
+        # concurrent insert (e.g. /start registering the user meanwhile).
+        await self._cache.add(key, self.MISSING, self._negative_ttl)
 
     @staticmethod
-    def _serialize(obj) -> Dict[str, Any]:
-        data: Dict[str, Any] = {}
-        for column in obj.__table__.columns:
-            value = getattr(obj, column.name)
-
-            if isinstance(value, enum.Enum):
-                value = value.value
+    def _is_missing(data: Dict[str, Any]) -> bool:
+        return data.get("__missing__") is True
 
-            from datetime import datetime
-            if isinstance(value, datetime):
-                value = value.isoformat()
+    @staticmethod
+    def _telegram_index_key(telegram_id: int) -> str:
+        return f"{User.__tablename__}:tg:{telegram_id}"
 
-            data[column.name] = value
-        return data
+    async def _cache_entity(self, entity: Any) -> None:
+        await self._cache.set(f"{entity.__tablename__}:{entity.id}", self._serialize(entity))
+        if isinstance(entity, User):
+            await self._cache.set(self._telegram_index_key(entity.telegram_id), {"id": entity.id})
 
+    @staticmethod
+    def _serialize(obj) -> Dict[str, Any]:
+        return codec_for(type(obj)).encode(obj)
 
     @staticmethod
     def _deserialize(entity_class: Type[T], data: Dict[str, Any]) -> T:
-        from sqlalchemy import Enum as SAEnum_local
-
-        kwargs: Dict[str, Any] = {}
-        for column in entity_class.__table__.columns:
-            value = data.get(column.name)
-            col_type = column.type
-            if isinstance(col_type, SAEnum_local) and value is not None:
-                enum_cls = col_type.enum_class
-                if enum_cls is not None:
-                    value = enum_cls(value)
-            kwargs[column.name] = value
-        return entity_class(**kwargs)
+        return codec_for(entity_class).decode(data)
@@ -1,32 +1,125 @@
 from aiogram import Bot
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
 
+from template.message import Messages
+from .broadcast import BroadcastEngine
+from .codecs import get_wire_format
 from .config import settings
+from .counters import ApprovedCardsCounter
 from .database import Database, SqlEndpointRepository
-from .inmemory import AsyncRedisCache
+from .inmemory import AsyncRedisCache, CircuitBreaker, TieredRedisCache
+from .ledger import BalanceLedger
+from .outbox import OutboxDispatcher
+from .purchases import PurchaseEngine
+from .roles import AdminRoles
+from .throttle import BotCallScheduler, ThrottlingRequestMiddleware
 
 db: Database | None = None
 redis_cache: AsyncRedisCache | None = None
 repo: SqlEndpointRepository | None = None
+roles: AdminRoles | None = None
+approved_counter: ApprovedCardsCounter | None = None
+ledger: BalanceLedger | None = None
+purchases: PurchaseEngine | None = None
+outbox: OutboxDispatcher | None = None
+broadcasts: BroadcastEngine | None = None
 bot: Bot | None = None
 
 
-async def init() -> None:
-    global db, redis_cache, repo, bot
+async def init(bot_api_share: float = 1.0) -> None:
+    global db, redis_cache, repo, roles, approved_counter, ledger, purchases, outbox, broadcasts, bot
 
     db = Database(settings.database_url)
     await db.init_db()
 
-    redis_cache = AsyncRedisCache(settings.redis_url)
+    wire_format = get_wire_format(settings.cache_wire_format)
+    breaker = CircuitBreaker(
+        failure_threshold=settings.redis_breaker_failure_threshold,
+        reset_timeout=settings.redis_breaker_reset_timeout,
+    )
+    if settings.l1_cache_enabled:
+        redis_cache = TieredRedisCache(
+            settings.redis_url,
+            wire_format,
+            op_timeout=settings.redis_op_timeout,
+            breaker=breaker,
+            l1_max_size=settings.l1_cache_max_size,
+            l1_ttl=settings.l1_cache_ttl,
+        )
+    else:
+        redis_cache = AsyncRedisCache(
+            settings.redis_url,
+            wire_format,
+            op_timeout=settings.redis_op_timeout,
+            breaker=breaker,
+        )
     await redis_cache.init()
 
-    repo = SqlEndpointRepository(db.async_sessionmaker, redis_cache)
+    repo = SqlEndpointRepository(db.async_sessionmaker, redis_cache, negative_ttl=settings.negative_cache_ttl)
+
+    roles = AdminRoles(
+        db.async_sessionmaker,
+        redis_cache,
+        refresh_interval=settings.admin_roles_refresh_interval,
+    )
+    await roles.init()
+
+    approved_counter = ApprovedCardsCounter(
+        db.async_sessionmaker,
+        redis_cache,
+        reconcile_interval=settings.approved_counter_reconcile_interval,
+    )
+    await approved_counter.reconcile()
+
+    ledger = BalanceLedger(
+        db.async_sessionmaker,
+        repo,
+        fold_interval=settings.ledger_fold_interval,
+        fold_batch_size=settings.ledger_fold_batch_size,
+    )
+    purchases = PurchaseEngine(db.async_sessionmaker)
 
+    session = None
+    if settings.telegram_api_base:
+        # A self-hosted Bot API server, or the load-test stand-in.
+        session = AiohttpSession(api=TelegramAPIServer.from_base(settings.telegram_api_base))
     bot = Bot(
         token=settings.tg_api_token,
+        session=session,
         default=DefaultBotProperties(
             parse_mode=ParseMode.HTML,
             link_preview_is_disabled=True,
         ),
     )
+    bot.session.middleware(
+        ThrottlingRequestMiddleware(
+            BotCallScheduler(
+                # Processes sharing one bot token split its global flood limit.
+                global_rate=settings.bot_api_global_rate * bot_api_share,
+                chat_rate=settings.bot_api_chat_rate,
+                chat_burst=settings.bot_api_chat_burst,
+                group_rate=settings.bot_api_group_rate,
+            ),
+            max_retries=settings.bot_api_max_retries,
+        )
+    )
+
+    outbox = OutboxDispatcher(
+        db.async_sessionmaker,
+        bot,
+        batch_size=settings.outbox_batch_size,
+        poll_interval=settings.outbox_poll_interval,
+        max_attempts=settings.outbox_max_attempts,
+    )
+
+    broadcasts = BroadcastEngine(
+        db.async_sessionmaker,
+        redis_cache,
+        bot,
+        progress_formatter=Messages.broadcast_progress,
+        chunk_size=settings.broadcast_chunk_size,
+        concurrency=settings.broadcast_concurrency,
+    )
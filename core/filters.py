@@ -2,7 +2,6 @@ from aiogram.filters import BaseFilter
 from aiogram.types import CallbackQuery, Message
 
 import core.di as di
-from core.database import User
 
 
 class CallbackScopeFilter(BaseFilter):
@@ -22,7 +21,6 @@ class AdminFilter(BaseFilter):
     async def __call__(self, obj: Message | CallbackQuery) -> bool:
         if obj.from_user is None:
             return False
-        if di.repo is None:
+        if di.roles is None:
             return False
-        user = await di.repo.get_user_by_telegram_id(obj.from_user.id)
-        return bool(user and user.is_admin)
+        return di.roles.is_admin(obj.from_user.id)
@@ -0,0 +1,150 @@
+import json
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Mapping, Optional
+
+import redis.asyncio as redis
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.redis import DefaultKeyBuilder, KeyBuilder
+
+
+@dataclass
+class _PendingState:
+    state: Optional[str] = None
+    data: dict[str, Any] = field(default_factory=dict)
+    state_known: bool = False
+    data_known: bool = False
+    state_dirty: bool = False
+    data_dirty: bool = False
+
+
+_update_buffer: ContextVar[Optional[dict[StorageKey, _PendingState]]] = ContextVar("fsm_update_buffer", default=None)
+_last_read: ContextVar[Optional[tuple[StorageKey, _PendingState]]] = ContextVar("fsm_last_read", default=None)
+
+
+class BufferedRedisStorage(BaseStorage):
+    # Inside buffered() an update's reads and writes hit an in-memory buffer that is
+    # flushed as one pipeline at the end; outside of it every call goes to Redis.
+    # Keys are laid out like aiogram's RedisStorage.
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        key_builder: Optional[KeyBuilder] = None,
+        ttl: Optional[int] = None,
+    ) -> None:
+        self._redis = redis_client
+        self._key_builder = key_builder or DefaultKeyBuilder()
+        self._ttl = ttl or None
+
+    @classmethod
+    def from_url(cls, url: str, ttl: Optional[int] = None) -> "BufferedRedisStorage":
+        return cls(redis.from_url(url), ttl=ttl)
+
+    @asynccontextmanager
+    async def buffered(self, key: Optional[StorageKey] = None) -> AsyncIterator[None]:
+        # aiogram's FSM middleware reads the update's state before this scope opens;
+        # that read fetched the data as well, so it seeds the buffer instead of
+        # being repeated.
+        buffer: dict[StorageKey, _PendingState] = {}
+        last_read = _last_read.get()
+        _last_read.set(None)
+        if key is not None and last_read is not None and last_read[0] == key:
+            buffer[key] = last_read[1]
+        token = _update_buffer.set(buffer)
+        try:
+            yield
+        finally:
+            _update_buffer.reset(token)
+            await self._flush(buffer)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        value = state.state if isinstance(state, State) else state
+        buffer = _update_buffer.get()
+        if buffer is None:
+            _last_read.set(None)
+            await self._write(key, state=value)
+            return
+        pending = buffer.setdefault(key, _PendingState())
+        pending.state, pending.state_known, pending.state_dirty = value, True, True
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._load(key)).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        buffer = _update_buffer.get()
+        if buffer is None:
+            _last_read.set(None)
+            await self._write(key, data=dict(data))
+            return
+        pending = buffer.setdefault(key, _PendingState())
+        pending.data, pending.data_known, pending.data_dirty = dict(data), True, True
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return dict((await self._load(key)).data)
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+    async def _load(self, key: StorageKey) -> _PendingState:
+        buffer = _update_buffer.get()
+        pending = buffer.get(key) if buffer is not None else None
+        if pending is None:
+            pending = _PendingState()
+            if buffer is not None:
+                buffer[key] = pending
+            else:
+                _last_read.set((key, pending))
+        if pending.state_known and pending.data_known:
+            return pending
+
+        raw_state, raw_data = await self._redis.mget(self._key(key, "state"), self._key(key, "data"))
+        if not pending.state_known:
+            pending.state = raw_state.decode("utf-8") if raw_state is not None else None
+            pending.state_known = True
+        if not pending.data_known:
+            pending.data = json.loads(raw_data) if raw_data is not None else {}
+            pending.data_known = True
+        return pending
+
+    async def _flush(self, buffer: dict[StorageKey, _PendingState]) -> None:
+        dirty = [(key, pending) for key, pending in buffer.items() if pending.state_dirty or pending.data_dirty]
+        if not dirty:
+            return
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for key, pending in dirty:
+                if pending.state_dirty:
+                    self._queue_write(pipe, self._key(key, "state"), pending.state)
+                if pending.data_dirty:
+                    self._queue_write(pipe, self._key(key, "data"), self._dump_data(pending.data))
+            await pipe.execute()
+
+    async def _write(
+        self,
+        key: StorageKey,
+        state: Optional[str] = None,
+        data: Optional[dict[str, Any]] = None,
+    ) -> None:
+        if data is None:
+            target, value = self._key(key, "state"), state
+        else:
+            target, value = self._key(key, "data"), self._dump_data(data)
+        if value is None:
+            await self._redis.delete(target)
+        else:
+            await self._redis.set(target, value, ex=self._ttl)
+
+    def _queue_write(self, pipe: redis.client.Pipeline, target: str, value: Optional[str]) -> None:
+        if value is None:
+            pipe.delete(target)
+        else:
+            pipe.set(target, value, ex=self._ttl)
+
+    @staticmethod
+    def _dump_data(data: dict[str, Any]) -> Optional[str]:
+        return json.dumps(data, ensure_ascii=False) if data else None
+
+    def _key(self, key: StorageKey, part: str) -> str:
+        return self._key_builder.build(key, part)
@@ -1,49 +1,427 @@
-import json
-from typing import Any, Optional
+import asyncio
+import enum
+import inspect
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Mapping, Optional, Sequence
 
 import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+from misc import BotLogger
+from .codecs import PayloadCodec, WireFormat
+from .metrics import (
+    l1_cache_evictions_total,
+    l1_cache_hits_total,
+    l1_cache_misses_total,
+    redis_cache_failures_total,
+    redis_circuit_state,
+)
+
+logger = BotLogger.get_logger("Cache")
+
+MessageHandler = Callable[[str], Optional[Awaitable[None]]]
+
+
+_INCR_EXISTING_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('INCRBY', KEYS[1], ARGV[1])
+end
+return nil
+"""
+
+_REFRESH_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class BreakerState(enum.IntEnum):
+    closed = 0
+    half_open = 1
+    open = 2
+
+
+class CircuitBreaker:
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0) -> None:
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = 0.0
+        self.state = BreakerState.closed
+        redis_circuit_state.set(self.state)
+
+    def allow(self) -> bool:
+        if self.state is BreakerState.closed:
+            return True
+        now = time.monotonic()
+        if now - self._opened_at < self._reset_timeout:
+            return False
+        # One probe per reset window; a probe that never reports back (cancelled
+        # with its caller) is simply replaced by the next window's probe.
+        self._opened_at = now
+        self._set_state(BreakerState.half_open)
+        return True
+
+    def record_success(self) -> None:
+        self._failures = 0
+        if self.state is not BreakerState.closed:
+            logger.info("Redis recovered, cache path re-enabled")
+            self._set_state(BreakerState.closed)
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self.state is BreakerState.half_open or self._failures >= self._failure_threshold:
+            if self.state is BreakerState.closed:
+                logger.warning(f"Redis failed {self._failures} times in a row, bypassing the cache")
+            self._opened_at = time.monotonic()
+            self._set_state(BreakerState.open)
+
+    def _set_state(self, state: BreakerState) -> None:
+        self.state = state
+        redis_circuit_state.set(state)
 
 
 class AsyncRedisCache:
+    MAX_DIRTY_KEYS = 10_000
 
-    def __init__(self, redis_url: str) -> None:
+    def __init__(
+        self,
+        redis_url: str,
+        wire_format: Optional[WireFormat] = None,
+        op_timeout: float = 0.1,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
         self._redis_url = redis_url
         self._redis: Optional[redis.Redis] = None
+        self._codec = PayloadCodec(wire_format)
+        self._op_timeout = op_timeout
+        self._breaker = breaker or CircuitBreaker()
+        self._dirty: set[str] = set()
+        self._pubsub: Optional[redis.client.PubSub] = None
+        self._subscribers: dict[str, list[MessageHandler]] = {}
+        self._listener: Optional[asyncio.Task] = None
 
     async def init(self) -> None:
         if self._redis is None:
+            # Payloads may be binary (msgpack), so responses stay as bytes.
             self._redis = redis.from_url(
                 self._redis_url,
-                encoding="utf-8",
-                decode_responses=True,
+                decode_responses=False,
             )
 
-    async def get(self, key: str) -> Optional[dict[str, Any]]:
+    async def _guarded(
+        self,
+        operation: Callable[[redis.Redis], Awaitable[Any]],
+        default: Any = None,
+        writes: Sequence[str] = (),
+    ) -> Any:
+        # Every cache call is bounded by the op timeout, and skipped outright while
+        # the breaker is open, so a sick Redis degrades to plain DB reads.
         if self._redis is None:
+            return default
+        if not self._breaker.allow():
+            self._mark_dirty(writes)
+            return default
+
+        # Writes skipped while Redis was out may have left stale entries behind;
+        # the recovery probe drops them before anything is read again.
+        stale = self._take_dirty() if self._breaker.state is BreakerState.half_open else []
+
+        async def run() -> Any:
+            if stale:
+                await self._redis.delete(*stale)
+            return await operation(self._redis)
+
+        try:
+            result = await asyncio.wait_for(run(), self._op_timeout)
+        except asyncio.TimeoutError:
+            redis_cache_failures_total.labels("timeout").inc()
+        except (RedisError, OSError) as e:
+            redis_cache_failures_total.labels("error").inc()
+            logger.debug(f"Redis operation failed: {e}")
+        else:
+            self._breaker.record_success()
+            return result
+
+        self._breaker.record_failure()
+        self._mark_dirty(stale)
+        self._mark_dirty(writes)
+        return default
+
+    def _mark_dirty(self, keys: Sequence[str]) -> None:
+        if not keys:
+            return
+        if len(self._dirty) + len(keys) > self.MAX_DIRTY_KEYS:
+            logger.error(f"Dropping {len(keys)} stale cache keys: too many writes skipped during the outage")
+            return
+        self._dirty.update(keys)
+
+    def _take_dirty(self) -> list[str]:
+        stale, self._dirty = list(self._dirty), set()
+        return stale
+
+    async def get(self, key: str) -> Optional[dict[str, Any]]:
+        raw = await self._guarded(lambda r: r.get(key))
+        if raw is None:
             return None
-        raw = await self._redis.get(key)
+        return self._codec.loads(raw)
+
+    async def set(self, key: str, value: dict[str, Any], ttl: Optional[int] = None) -> None:
+        data = self._codec.dumps(value)
+        await self._guarded(lambda r: r.set(key, data, ex=ttl or None), writes=(key,))
+
+    async def add(self, key: str, value: dict[str, Any], ttl: Optional[int] = None) -> bool:
+        data = self._codec.dumps(value)
+        return bool(await self._guarded(lambda r: r.set(key, data, nx=True, ex=ttl or None), False))
+
+    async def delete(self, key: str) -> None:
+        await self._guarded(lambda r: r.delete(key), writes=(key,))
+
+    async def get_many(self, keys: Sequence[str]) -> dict[str, dict[str, Any]]:
+        if not keys:
+            return {}
+        raws = await self._guarded(lambda r: r.mget(keys), [])
+        result: dict[str, dict[str, Any]] = {}
+        for key, raw in zip(keys, raws):
+            if raw is None:
+                continue
+            value = self._codec.loads(raw)
+            if value is not None:
+                result[key] = value
+        return result
+
+    async def set_many(
+        self,
+        items: Mapping[str, dict[str, Any]],
+        ttl: Optional[int] = None,
+        ttls: Optional[Mapping[str, int]] = None,
+    ) -> None:
+        if not items:
+            return
+
+        async def run(r: redis.Redis) -> None:
+            # MSET cannot carry expirations, so per-key TTLs go through one pipelined batch of SETs.
+            async with r.pipeline(transaction=False) as pipe:
+                for key, value in items.items():
+                    key_ttl = ttls.get(key, ttl) if ttls else ttl
+                    pipe.set(key, self._codec.dumps(value), ex=key_ttl or None)
+                await pipe.execute()
+
+        await self._guarded(run, writes=list(items))
+
+    async def get_counter(self, key: str) -> Optional[int]:
+        raw = await self._guarded(lambda r: r.get(key))
         if raw is None:
             return None
         try:
-            return json.loads(raw)
-        except json.JSONDecodeError:
+            return int(raw)
+        except ValueError:
             return None
 
-    async def set(self, key: str, value: dict[str, Any], ttl: Optional[int] = None) -> None:
+    async def set_counter(self, key: str, value: int, ttl: Optional[int] = None) -> None:
+        await self._guarded(lambda r: r.set(key, value, ex=ttl), writes=(key,))
+
+    async def incr_existing(self, key: str, amount: int = 1) -> Optional[int]:
+        # A lost increment leaves the counter dirty, so it is recounted after recovery.
+        return await self._guarded(lambda r: r.eval(_INCR_EXISTING_SCRIPT, 1, key, amount), writes=(key,))
+
+    async def acquire_lock(self, key: str, token: str, ttl: int) -> bool:
+        if self._redis is None:
+            return True
+        return bool(await self._redis.set(key, token, nx=True, ex=ttl))
+
+    async def refresh_lock(self, key: str, token: str, ttl: int) -> bool:
+        if self._redis is None:
+            return True
+        return bool(await self._redis.eval(_REFRESH_LOCK_SCRIPT, 1, key, token, ttl))
+
+    async def release_lock(self, key: str, token: str) -> None:
         if self._redis is None:
             return
-        data = json.dumps(value, ensure_ascii=False)
-        if ttl:
-            await self._redis.set(key, data, ex=ttl)
-        else:
-            await self._redis.set(key, data)
+        await self._redis.eval(_RELEASE_LOCK_SCRIPT, 1, key, token)
 
-    async def delete(self, key: str) -> None:
+    async def publish(self, channel: str, message: str) -> None:
+        await self._guarded(lambda r: r.publish(channel, message))
+
+    async def subscribe(self, channel: str, handler: MessageHandler) -> None:
         if self._redis is None:
             return
-        await self._redis.delete(key)
+        if self._pubsub is None:
+            self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        if channel not in self._subscribers:
+            await self._pubsub.subscribe(channel)
+        self._subscribers.setdefault(channel, []).append(handler)
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Redis pub/sub listener error: {e}")
+                await asyncio.sleep(1)
+                continue
+            if message is None:
+                continue
+
+            channel = message["channel"].decode("utf-8")
+            data = message["data"].decode("utf-8")
+            for handler in self._subscribers.get(channel, ()):
+                try:
+                    result = handler(data)
+                    if inspect.isawaitable(result):
+                        await result
+                except Exception as e:
+                    logger.error(f"Pub/sub handler for {channel} failed: {e}")
 
     async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
         if self._redis is not None:
             await self._redis.close()
             self._redis = None
+
+
+class LocalLRUCache:
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, dict[str, Any]]] = OrderedDict()
+
+    def get(self, key: str) -> Optional[dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            l1_cache_misses_total.inc()
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            l1_cache_misses_total.inc()
+            return None
+        self._entries.move_to_end(key)
+        l1_cache_hits_total.inc()
+        # Callers are free to mutate what they get back.
+        return dict(value)
+
+    def set(self, key: str, value: dict[str, Any], ttl: Optional[float] = None) -> None:
+        ttl = self._ttl if ttl is None else min(ttl, self._ttl)
+        self._entries[key] = (time.monotonic() + ttl, dict(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+            l1_cache_evictions_total.inc()
+
+    def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class TieredRedisCache(AsyncRedisCache):
+    INVALIDATION_CHANNEL = "cache:invalidate"
+
+    def __init__(
+        self,
+        redis_url: str,
+        wire_format: Optional[WireFormat] = None,
+        op_timeout: float = 0.1,
+        breaker: Optional[CircuitBreaker] = None,
+        l1_max_size: int = 10_000,
+        l1_ttl: float = 30.0,
+    ) -> None:
+        super().__init__(redis_url, wire_format, op_timeout, breaker)
+        self._local = LocalLRUCache(l1_max_size, l1_ttl)
+        self._instance_id = uuid.uuid4().hex
+
+    async def init(self) -> None:
+        await super().init()
+        await self.subscribe(self.INVALIDATION_CHANNEL, self._on_invalidate)
+
+    async def get(self, key: str) -> Optional[dict[str, Any]]:
+        value = self._local.get(key)
+        if value is not None:
+            return value
+        value = await super().get(key)
+        if value is not None:
+            self._local.set(key, value)
+        return value
+
+    async def set(self, key: str, value: dict[str, Any], ttl: Optional[int] = None) -> None:
+        await super().set(key, value, ttl)
+        self._local.set(key, value, ttl)
+        await self._broadcast_invalidation(key)
+
+    async def add(self, key: str, value: dict[str, Any], ttl: Optional[int] = None) -> bool:
+        added = await super().add(key, value, ttl)
+        if added:
+            self._local.set(key, value, ttl)
+            await self._broadcast_invalidation(key)
+        return added
+
+    async def delete(self, key: str) -> None:
+        self._local.delete(key)
+        await super().delete(key)
+        await self._broadcast_invalidation(key)
+
+    async def get_many(self, keys: Sequence[str]) -> dict[str, dict[str, Any]]:
+        result: dict[str, dict[str, Any]] = {}
+        missing: list[str] = []
+        for key in keys:
+            value = self._local.get(key)
+            if value is None:
+                missing.append(key)
+            else:
+                result[key] = value
+
+        fetched = await super().get_many(missing)
+        for key, value in fetched.items():
+            self._local.set(key, value)
+        result.update(fetched)
+        return result
+
+    async def set_many(
+        self,
+        items: Mapping[str, dict[str, Any]],
+        ttl: Optional[int] = None,
+        ttls: Optional[Mapping[str, int]] = None,
+    ) -> None:
+        await super().set_many(items, ttl, ttls)
+        for key, value in items.items():
+            self._local.set(key, value, ttls.get(key, ttl) if ttls else ttl)
+        await self._broadcast_invalidation(*items)
+
+    async def _broadcast_invalidation(self, *keys: str) -> None:
+        if not keys:
+            return
+        try:
+            await self.publish(self.INVALIDATION_CHANNEL, f"{self._instance_id}:" + "\n".join(keys))
+        except Exception as e:
+            # Peers fall back to their L1 TTL if the signal is lost.
+            logger.error(f"Failed to publish cache invalidation for {len(keys)} keys: {e}")
+
+    def _on_invalidate(self, message: str) -> None:
+        origin, _, keys = message.partition(":")
+        if origin != self._instance_id:
+            for key in keys.split("\n"):
+                self._local.delete(key)
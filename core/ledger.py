@@ -0,0 +1,125 @@
+import asyncio
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from misc import BotLogger
+from .database import BalanceLedgerEntry, LedgerEntryKind, SqlEndpointRepository, User
+from .uow import UnitOfWork
+
+logger = BotLogger.get_logger("Ledger")
+
+_FOLD_STATEMENT = text("""
+WITH batch AS (
+    SELECT id FROM balance_ledger
+    WHERE NOT folded
+    ORDER BY id
+    LIMIT :batch_size
+    FOR UPDATE SKIP LOCKED
+),
+moved AS (
+    UPDATE balance_ledger AS l SET folded = true
+    FROM batch
+    WHERE l.id = batch.id
+    RETURNING l.user_id, l.amount
+),
+totals AS (
+    SELECT user_id, sum(amount) AS total FROM moved GROUP BY user_id
+),
+applied AS (
+    UPDATE users SET balance = users.balance + totals.total
+    FROM totals
+    WHERE users.id = totals.user_id
+    RETURNING users.id
+)
+SELECT (SELECT count(*) FROM moved) AS entries, (SELECT array_agg(id) FROM applied) AS user_ids
+""")
+
+
+def unfolded_tail(user_id):
+    return (
+        select(func.coalesce(func.sum(BalanceLedgerEntry.amount), 0.0))
+        .where(BalanceLedgerEntry.user_id == user_id, ~BalanceLedgerEntry.folded)
+        .scalar_subquery()
+    )
+
+
+def available_balance(user_id):
+    return (
+        select(User.balance + unfolded_tail(user_id))
+        .where(User.id == user_id)
+        .scalar_subquery()
+    )
+
+
+async def lock_user(session: AsyncSession, user_id: int) -> bool:
+    # FOR NO KEY UPDATE does not conflict with the KEY SHARE locks taken by ledger
+    # inserts, so credits to this user keep flowing while a debit is being decided.
+    locked = await session.scalar(
+        select(User.id).where(User.id == user_id).with_for_update(key_share=True)
+    )
+    return locked is not None
+
+
+class BalanceLedger:
+
+    def __init__(
+        self,
+        async_sessionmaker: async_sessionmaker[AsyncSession],
+        repo: Optional[SqlEndpointRepository] = None,
+        fold_interval: float = 5.0,
+        fold_batch_size: int = 1000,
+    ) -> None:
+        self._async_sessionmaker = async_sessionmaker
+        self._repo = repo
+        self._fold_interval = fold_interval
+        self._fold_batch_size = fold_batch_size
+
+    async def get_balance(self, user_id: int, uow: Optional[UnitOfWork] = None) -> float:
+        if uow is not None:
+            session = await uow.session()
+            return await session.scalar(select(available_balance(user_id))) or 0.0
+
+        async with self._async_sessionmaker() as session:
+            balance = await session.scalar(select(available_balance(user_id)))
+            return balance or 0.0
+
+    async def top_up(self, user_id: int, amount: float, reference_id: Optional[int] = None) -> None:
+        async with self._async_sessionmaker() as session:
+            async with session.begin():
+                session.add(
+                    BalanceLedgerEntry(
+                        user_id=user_id,
+                        amount=amount,
+                        kind=LedgerEntryKind.topup,
+                        reference_id=reference_id,
+                        created_at=datetime.now(timezone.utc),
+                    )
+                )
+
+    async def fold(self) -> int:
+        folded = 0
+        while True:
+            async with self._async_sessionmaker() as session:
+                async with session.begin():
+                    result = await session.execute(_FOLD_STATEMENT, {"batch_size": self._fold_batch_size})
+                    row = result.one()
+                    entries = row.entries
+            if self._repo is not None:
+                for user_id in row.user_ids or ():
+                    await self._repo.invalidate(User, user_id)
+            folded += entries
+            if entries < self._fold_batch_size:
+                return folded
+
+    async def run_folder(self) -> None:
+        while True:
+            await asyncio.sleep(self._fold_interval)
+            try:
+                folded = await self.fold()
+                if folded:
+                    logger.debug(f"Folded {folded} ledger entries into balances")
+            except Exception as e:
+                logger.error(f"Failed to fold balance ledger: {e}")
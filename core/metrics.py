@@ -1,4 +1,4 @@
-from prometheus_client import Counter, Gauge, start_http_server
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
 import threading
 
 metric_errors_total = Counter(
@@ -26,6 +26,114 @@ cards_total = Gauge(
     "Количество карточек в системе"
 )
 
+notifications_sent_total = Counter(
+    "bot_notifications_sent_total",
+    "Количество уведомлений, доставленных из outbox"
+)
+
+notifications_failed_total = Counter(
+    "bot_notifications_failed_total",
+    "Количество уведомлений, от которых outbox отказался"
+)
+
+bot_api_queue_depth = Gauge(
+    "bot_api_queue_depth",
+    "Количество исходящих вызовов Bot API, ожидающих в очереди",
+    ["priority"]
+)
+
+bot_api_wait_seconds = Histogram(
+    "bot_api_wait_seconds",
+    "Время ожидания исходящего вызова Bot API в очереди",
+    ["priority"],
+    buckets=(0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+
+l1_cache_hits_total = Counter(
+    "bot_l1_cache_hits_total",
+    "Попадания в локальный (L1) кэш"
+)
+
+l1_cache_misses_total = Counter(
+    "bot_l1_cache_misses_total",
+    "Промахи локального (L1) кэша"
+)
+
+l1_cache_evictions_total = Counter(
+    "bot_l1_cache_evictions_total",
+    "Вытеснения из локального (L1) кэша по размеру"
+)
+
+bot_api_retry_after_total = Counter(
+    "bot_api_retry_after_total",
+    "Количество ответов 429 (retry_after) от Bot API"
+)
+
+redis_circuit_state = Gauge(
+    "bot_redis_circuit_state",
+    "Состояние автомата защиты кэша Redis (0 - закрыт, 1 - пробный запрос, 2 - открыт)"
+)
+
+redis_cache_failures_total = Counter(
+    "bot_redis_cache_failures_total",
+    "Неудачные операции с кэшем Redis",
+    ["reason"]
+)
+
+update_reply_seconds = Histogram(
+    "bot_update_reply_seconds",
+    "Время от получения апдейта через вебхук до первого ответа бота",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+
+webhook_rejected_total = Counter(
+    "bot_webhook_rejected_total",
+    "Отклонённые запросы к вебхуку",
+    ["reason"]
+)
+
+stream_updates_ingested_total = Counter(
+    "bot_stream_updates_ingested_total",
+    "Апдейты, переданные в Redis Streams",
+    ["shard"]
+)
+
+stream_updates_processed_total = Counter(
+    "bot_stream_updates_processed_total",
+    "Апдейты, обработанные воркерами из Redis Streams",
+    ["shard", "result"]
+)
+
+updates_waiting = Gauge(
+    "bot_updates_waiting",
+    "Апдейты, ожидающие своей очереди в планировщике"
+)
+
+updates_shed_total = Counter(
+    "bot_updates_shed_total",
+    "Апдейты, отброшенные или схлопнутые планировщиком",
+    ["reason"]
+)
+
+handler_seconds = Histogram(
+    "bot_handler_seconds",
+    "Время обработки апдейта хендлером",
+    ["router", "handler", "update_type"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+
+handlers_in_flight = Gauge(
+    "bot_handlers_in_flight",
+    "Хендлеры, выполняющиеся в данный момент",
+    ["router", "handler"]
+)
+
+handler_errors_total = Counter(
+    "bot_handler_errors_total",
+    "Исключения, выброшенные хендлерами, по классу исключения",
+    ["router", "handler", "exception"]
+)
+
 
 def start_metrics_server(port: int = 9000):
     def run():
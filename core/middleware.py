@@ -1,8 +1,26 @@
+import time
+
 from aiogram import BaseMiddleware
-from aiogram.types import CallbackQuery, TelegramObject
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.types import CallbackQuery, TelegramObject, Update
 from aiogram.fsm.context import FSMContext
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from typing import Any, Awaitable, Callable
-from core.metrics import metric_errors_total
+from core.database import SqlEndpointRepository
+from core.fsm import BufferedRedisStorage
+from core.metrics import (
+    handler_errors_total,
+    handler_seconds,
+    handlers_in_flight,
+    metric_errors_total,
+    users_total,
+)
+from core.recorder import UpdateRecorder
+from core.streams import UpdateIngest
+from core.uow import UnitOfWork
+from misc import BotLogger
+
+logger = BotLogger.get_logger(__name__)
 
 
 class ErrorsMiddleware(BaseMiddleware):
@@ -19,6 +37,38 @@ class ErrorsMiddleware(BaseMiddleware):
             raise
 
 
+def handler_name(handler: HandlerObject) -> str:
+    callback = handler.callback
+    return getattr(callback, "__name__", type(callback).__name__)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    # Inner and registered first: the handler is already resolved, and the time
+    # includes the unit of work committing after it.
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any]
+    ) -> Any:
+        router = data["event_router"].name
+        name = handler_name(data["handler"])
+        update = data.get("event_update")
+        update_type = update.event_type if update is not None else type(event).__name__
+
+        in_flight = handlers_in_flight.labels(router, name)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            handler_errors_total.labels(router, name, type(e).__name__).inc()
+            raise
+        finally:
+            handler_seconds.labels(router, name, update_type).observe(time.perf_counter() - started)
+            in_flight.dec()
+
+
 class CallbackStateMiddleware(BaseMiddleware):
     async def __call__(
         self,
@@ -35,3 +85,102 @@ class CallbackStateMiddleware(BaseMiddleware):
             )
 
         return await handler(event, data)
+
+
+class FSMWriteBufferMiddleware(BaseMiddleware):
+    # Registered on dispatcher.update after the built-in FSM middleware, so every
+    # state change made while handling the update is written in one round trip.
+    def __init__(self, storage: BufferedRedisStorage) -> None:
+        self._storage = storage
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any]
+    ) -> Any:
+        state: FSMContext | None = data.get("state")
+
+        async with self._storage.buffered(state.key if state else None):
+            return await handler(event, data)
+
+
+class UnitOfWorkMiddleware(BaseMiddleware):
+    # One lazily opened session and transaction per update, exposed to handlers as
+    # `uow`; committed when the handler returns, rolled back if it raises.
+    def __init__(self, async_sessionmaker: async_sessionmaker[AsyncSession]) -> None:
+        self._async_sessionmaker = async_sessionmaker
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any]
+    ) -> Any:
+        uow = UnitOfWork(self._async_sessionmaker)
+        data["uow"] = uow
+        try:
+            result = await handler(event, data)
+        except Exception:
+            await uow.rollback()
+            raise
+        await uow.commit()
+        return result
+
+
+class UserMiddleware(BaseMiddleware):
+    # Outer middleware: resolves the sender once per update, registering unknown
+    # users on the way, and hands the row to filters and handlers as `user`.
+    def __init__(self, repo: SqlEndpointRepository) -> None:
+        self._repo = repo
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any]
+    ) -> Any:
+        from_user = data.get("event_from_user")
+        if from_user is not None and not from_user.is_bot:
+            user, created = await self._repo.register_user(from_user.id, from_user.username)
+            if created:
+                users_total.inc()
+                logger.info("Создан новый пользователь %s", from_user.id)
+            data["user"] = user
+
+        return await handler(event, data)
+
+
+class StreamIngestMiddleware(BaseMiddleware):
+    # Sharded mode: the receiving process only forwards raw updates to Redis
+    # Streams; routers run in the worker processes.
+    def __init__(self, ingest: UpdateIngest) -> None:
+        self._ingest = ingest
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any]
+    ) -> Any:
+        await self._ingest.publish(event.model_dump(mode="json", exclude_unset=True, by_alias=True))
+
+
+class UpdateRecordMiddleware(BaseMiddleware):
+    # On dispatcher.update behind only aiogram's error and user-context middlewares
+    # and in front of the FSM read (see attach_recorder in main.py), so an update is
+    # recorded before storage or a handler can fail it.
+    def __init__(self, recorder: UpdateRecorder) -> None:
+        self._recorder = recorder
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any]
+    ) -> Any:
+        try:
+            self._recorder.record(event.model_dump(mode="json", exclude_none=True, by_alias=True))
+        except Exception as e:
+            logger.error(f"Failed to record update {event.update_id}: {e}")
+        return await handler(event, data)
@@ -0,0 +1,83 @@
+import importlib
+import pkgutil
+from types import ModuleType
+from typing import Sequence
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from misc import BotLogger
+from . import versions
+
+logger = BotLogger.get_logger("Migrations")
+
+# pg_advisory_xact_lock key shared by every bot instance applying migrations.
+MIGRATIONS_LOCK_KEY = 0x6D696E69
+
+
+def load_migrations() -> list[ModuleType]:
+    modules = [
+        importlib.import_module(f"{versions.__name__}.{info.name}")
+        for info in pkgutil.iter_modules(versions.__path__)
+        if info.name.startswith("m")
+    ]
+    modules.sort(key=lambda m: m.VERSION)
+
+    seen: set[int] = set()
+    for module in modules:
+        if module.VERSION in seen:
+            raise RuntimeError(f"Duplicate migration version {module.VERSION}")
+        seen.add(module.VERSION)
+    return modules
+
+
+class MigrationRunner:
+
+    def __init__(self, engine: AsyncEngine, migrations: Sequence[ModuleType] | None = None) -> None:
+        self._engine = engine
+        self._migrations = list(migrations) if migrations is not None else load_migrations()
+
+    @property
+    def latest_version(self) -> int:
+        return self._migrations[-1].VERSION if self._migrations else 0
+
+    async def current_version(self) -> int:
+        async with self._engine.connect() as conn:
+            return await self._read_version(conn)
+
+    async def run(self) -> int:
+        current = await self.current_version()
+        if current >= self.latest_version:
+            logger.info(f"Schema is up to date (version {current})")
+            return current
+
+        async with self._engine.begin() as conn:
+            await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATIONS_LOCK_KEY})
+            await conn.execute(text(
+                "CREATE TABLE IF NOT EXISTS schema_version ("
+                "version INTEGER PRIMARY KEY, "
+                "description VARCHAR NOT NULL, "
+                "applied_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+            ))
+
+            # Another instance may have migrated while we waited for the lock.
+            current = await self._read_version(conn)
+            for migration in self._migrations:
+                if migration.VERSION <= current:
+                    continue
+                logger.info(f"Applying migration {migration.VERSION}: {migration.DESCRIPTION}")
+                await migration.upgrade(conn)
+                await conn.execute(
+                    text("INSERT INTO schema_version (version, description) VALUES (:version, :description)"),
+                    {"version": migration.VERSION, "description": migration.DESCRIPTION},
+                )
+                current = migration.VERSION
+
+        return current
+
+    @staticmethod
+    async def _read_version(conn: AsyncConnection) -> int:
+        exists = await conn.scalar(text("SELECT to_regclass('schema_version') IS NOT NULL"))
+        if not exists:
+            return 0
+        return await conn.scalar(text("SELECT coalesce(max(version), 0) FROM schema_version"))
@@ -0,0 +1,81 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+VERSION = 1
+DESCRIPTION = "initial schema"
+
+# Frozen DDL: the schema as this version shipped it, independent of later model
+# changes. IF NOT EXISTS keeps it a no-op on databases created by the old
+# create_all startup.
+STATEMENTS = (
+    """
+    DO $$ BEGIN
+        CREATE TYPE cardstatus AS ENUM ('pending', 'approved', 'rejected', 'sold');
+    EXCEPTION WHEN duplicate_object THEN NULL;
+    END $$
+    """,
+    """
+    DO $$ BEGIN
+        CREATE TYPE withdrawstatus AS ENUM ('pending', 'completed');
+    EXCEPTION WHEN duplicate_object THEN NULL;
+    END $$
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id SERIAL NOT NULL,
+        telegram_id BIGINT NOT NULL,
+        username VARCHAR,
+        balance FLOAT NOT NULL,
+        is_admin BOOLEAN,
+        created_at TIMESTAMP WITH TIME ZONE,
+        updated_at TIMESTAMP WITH TIME ZONE,
+        PRIMARY KEY (id),
+        UNIQUE (telegram_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS cards (
+        id SERIAL NOT NULL,
+        owner_id INTEGER NOT NULL,
+        title VARCHAR NOT NULL,
+        description VARCHAR NOT NULL,
+        price FLOAT NOT NULL,
+        photo_file_id VARCHAR,
+        status cardstatus NOT NULL,
+        created_at TIMESTAMP WITH TIME ZONE,
+        updated_at TIMESTAMP WITH TIME ZONE,
+        PRIMARY KEY (id),
+        FOREIGN KEY (owner_id) REFERENCES users (id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS purchases (
+        id SERIAL NOT NULL,
+        buyer_id INTEGER,
+        card_id INTEGER,
+        amount FLOAT NOT NULL,
+        created_at TIMESTAMP WITH TIME ZONE,
+        PRIMARY KEY (id),
+        FOREIGN KEY (buyer_id) REFERENCES users (id) ON DELETE SET NULL,
+        FOREIGN KEY (card_id) REFERENCES cards (id) ON DELETE SET NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS withdraw_requests (
+        id SERIAL NOT NULL,
+        user_id INTEGER NOT NULL,
+        amount FLOAT NOT NULL,
+        requisites VARCHAR NOT NULL,
+        status withdrawstatus NOT NULL,
+        created_at TIMESTAMP WITH TIME ZONE,
+        updated_at TIMESTAMP WITH TIME ZONE,
+        PRIMARY KEY (id),
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+    )
+    """,
+)
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    for statement in STATEMENTS:
+        await conn.execute(text(statement))
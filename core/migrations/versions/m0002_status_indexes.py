@@ -0,0 +1,22 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+VERSION = 2
+DESCRIPTION = "status-aware indexes for catalog, moderation and withdrawals"
+
+STATEMENTS = (
+    # Catalog keyset paging, moderation queue and the approved counter all filter
+    # by status and walk by id.
+    "CREATE INDEX IF NOT EXISTS ix_cards_status_id ON cards (status, id)",
+    "CREATE INDEX IF NOT EXISTS ix_cards_owner_id ON cards (owner_id)",
+    "CREATE INDEX IF NOT EXISTS ix_withdraw_requests_pending_id "
+    "ON withdraw_requests (id) WHERE status = 'pending'",
+    "CREATE INDEX IF NOT EXISTS ix_withdraw_requests_user_id ON withdraw_requests (user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_purchases_buyer_id ON purchases (buyer_id)",
+    "CREATE INDEX IF NOT EXISTS ix_purchases_card_id ON purchases (card_id)",
+)
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    for statement in STATEMENTS:
+        await conn.execute(text(statement))
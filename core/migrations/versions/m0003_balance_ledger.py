@@ -0,0 +1,37 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+VERSION = 3
+DESCRIPTION = "append-only balance ledger"
+
+STATEMENTS = (
+    """
+    DO $$ BEGIN
+        CREATE TYPE ledgerentrykind AS ENUM ('purchase', 'sale', 'withdrawal', 'topup');
+    EXCEPTION WHEN duplicate_object THEN NULL;
+    END $$
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS balance_ledger (
+        id BIGSERIAL NOT NULL,
+        user_id INTEGER NOT NULL,
+        amount FLOAT NOT NULL,
+        kind ledgerentrykind NOT NULL,
+        reference_id INTEGER,
+        folded BOOLEAN NOT NULL,
+        created_at TIMESTAMP WITH TIME ZONE,
+        PRIMARY KEY (id),
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+    )
+    """,
+    # Balance reads sum a user's unfolded tail; the folder scans unfolded entries by id.
+    "CREATE INDEX IF NOT EXISTS ix_balance_ledger_unfolded_user "
+    "ON balance_ledger (user_id) WHERE NOT folded",
+    "CREATE INDEX IF NOT EXISTS ix_balance_ledger_unfolded_id "
+    "ON balance_ledger (id) WHERE NOT folded",
+)
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    for statement in STATEMENTS:
+        await conn.execute(text(statement))
@@ -0,0 +1,34 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+VERSION = 4
+DESCRIPTION = "transactional notification outbox"
+
+STATEMENTS = (
+    """
+    DO $$ BEGIN
+        CREATE TYPE outboxstatus AS ENUM ('pending', 'failed');
+    EXCEPTION WHEN duplicate_object THEN NULL;
+    END $$
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS notification_outbox (
+        id BIGSERIAL NOT NULL,
+        chat_id BIGINT NOT NULL,
+        text VARCHAR NOT NULL,
+        status outboxstatus NOT NULL,
+        attempts INTEGER NOT NULL,
+        next_attempt_at TIMESTAMP WITH TIME ZONE NOT NULL,
+        last_error VARCHAR,
+        created_at TIMESTAMP WITH TIME ZONE,
+        PRIMARY KEY (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_notification_outbox_due "
+    "ON notification_outbox (next_attempt_at, id) WHERE status = 'pending'",
+)
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    for statement in STATEMENTS:
+        await conn.execute(text(statement))
@@ -0,0 +1,16 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+VERSION = 5
+DESCRIPTION = "partial index for the admin role set"
+
+STATEMENTS = (
+    # Every instance reloads the admin ids on each role change and periodically;
+    # the handful of admins should not cost a scan of users.
+    "CREATE INDEX IF NOT EXISTS ix_users_admin_telegram_id ON users (telegram_id) WHERE is_admin",
+)
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    for statement in STATEMENTS:
+        await conn.execute(text(statement))
@@ -0,0 +1,136 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from misc import BotLogger
+from .database import OutboxMessage, OutboxStatus
+from .metrics import notifications_failed_total, notifications_sent_total
+from .throttle import bulk_priority
+
+logger = BotLogger.get_logger("Outbox")
+
+MAX_BACKOFF_SECONDS = 300
+
+
+def enqueue(session: AsyncSession, chat_id: int, text: str) -> None:
+    session.add(
+        OutboxMessage(
+            chat_id=chat_id,
+            text=text,
+            status=OutboxStatus.pending,
+            created_at=datetime.now(timezone.utc),
+            next_attempt_at=datetime.now(timezone.utc),
+        )
+    )
+
+
+class OutboxDispatcher:
+
+    def __init__(
+        self,
+        async_sessionmaker: async_sessionmaker[AsyncSession],
+        bot: Bot,
+        batch_size: int = 50,
+        poll_interval: float = 2.0,
+        lease_seconds: int = 60,
+        max_attempts: int = 8,
+    ) -> None:
+        self._async_sessionmaker = async_sessionmaker
+        self._bot = bot
+        self._batch_size = batch_size
+        self._poll_interval = poll_interval
+        self._lease = timedelta(seconds=lease_seconds)
+        self._max_attempts = max_attempts
+        self._wakeup = asyncio.Event()
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    async def run(self) -> None:
+        while True:
+            try:
+                processed = await self.dispatch_batch()
+            except Exception as e:
+                logger.error(f"Outbox dispatch failed: {e}")
+                processed = 0
+
+            if processed >= self._batch_size:
+                continue
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def dispatch_batch(self) -> int:
+        messages = await self._claim()
+        if not messages:
+            return 0
+
+        outcomes = await asyncio.gather(
+            *(self._send(chat_id, text, attempts) for _, chat_id, text, attempts in messages)
+        )
+
+        sent: list[int] = []
+        now = datetime.now(timezone.utc)
+        async with self._async_sessionmaker() as session:
+            async with session.begin():
+                for (message_id, chat_id, _, attempts), (delivered, retry_after, error) in zip(messages, outcomes):
+                    if delivered:
+                        sent.append(message_id)
+                        continue
+
+                    if retry_after is None or attempts >= self._max_attempts:
+                        notifications_failed_total.inc()
+                        logger.warning(f"Notification {message_id} to {chat_id} dropped: {error}")
+                        values = {"status": OutboxStatus.failed, "last_error": error}
+                    else:
+                        values = {"next_attempt_at": now + timedelta(seconds=retry_after), "last_error": error}
+                    await session.execute(
+                        update(OutboxMessage).where(OutboxMessage.id == message_id).values(**values)
+                    )
+
+                if sent:
+                    await session.execute(delete(OutboxMessage).where(OutboxMessage.id.in_(sent)))
+
+        notifications_sent_total.inc(len(sent))
+        return len(messages)
+
+    async def _claim(self) -> list[tuple[int, int, str, int]]:
+        # The lease moves claimed rows out of the due window, so the connection is
+        # released before any Telegram call; a crashed sender's rows come back after it.
+        now = datetime.now(timezone.utc)
+        due = (
+            select(OutboxMessage.id)
+            .where(OutboxMessage.status == OutboxStatus.pending, OutboxMessage.next_attempt_at <= now)
+            .order_by(OutboxMessage.next_attempt_at, OutboxMessage.id)
+            .limit(self._batch_size)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        async with self._async_sessionmaker() as session:
+            async with session.begin():
+                result = await session.execute(
+                    update(OutboxMessage)
+                    .where(OutboxMessage.id.in_(due))
+                    .values(next_attempt_at=now + self._lease, attempts=OutboxMessage.attempts + 1)
+                    .returning(OutboxMessage.id, OutboxMessage.chat_id, OutboxMessage.text, OutboxMessage.attempts)
+                )
+                return [tuple(row) for row in result.all()]
+
+    async def _send(self, chat_id: int, text: str, attempts: int) -> tuple[bool, float | None, str | None]:
+        try:
+            with bulk_priority():
+                await self._bot.send_message(chat_id=chat_id, text=text)
+            return True, None, None
+        except TelegramRetryAfter as e:
+            return False, float(e.retry_after), str(e)
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            return False, None, str(e)
+        except Exception as e:
+            return False, min(2 ** attempts, MAX_BACKOFF_SECONDS), str(e)
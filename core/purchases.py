@@ -0,0 +1,157 @@
+import enum
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from sqlalchemy import cast, false, func, insert, literal, select, true, union_all, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from .database import BalanceLedgerEntry, Card, CardStatus, LedgerEntryKind, Purchase, User
+from .ledger import available_balance, lock_user
+from .outbox import enqueue
+
+
+class PurchaseStatus(enum.Enum):
+    completed = "completed"
+    card_unavailable = "card_unavailable"
+    buyer_not_found = "buyer_not_found"
+    own_card = "own_card"
+    insufficient_funds = "insufficient_funds"
+
+
+@dataclass(frozen=True)
+class PurchaseResult:
+    status: PurchaseStatus
+    card_id: int
+    buyer_id: Optional[int] = None
+    seller_id: Optional[int] = None
+    title: Optional[str] = None
+    price: Optional[float] = None
+    seller_telegram_id: Optional[int] = None
+    purchase_id: Optional[int] = None
+
+
+class PurchaseEngine:
+
+    def __init__(self, async_sessionmaker: async_sessionmaker[AsyncSession]) -> None:
+        self._async_sessionmaker = async_sessionmaker
+
+    async def buy(
+        self,
+        card_id: int,
+        buyer_id: int,
+        seller_notification: Optional[Callable[[str, float], str]] = None,
+    ) -> PurchaseResult:
+        async with self._async_sessionmaker() as session:
+            # The caller already resolved the buyer; locking the row also proves it exists.
+            if not await lock_user(session, buyer_id):
+                await session.rollback()
+                return PurchaseResult(status=PurchaseStatus.buyer_not_found, card_id=card_id)
+
+            result = await session.execute(self._purchase_statement(card_id, buyer_id))
+            row = result.first()
+            if row is not None:
+                if seller_notification is not None:
+                    enqueue(session, row.seller_telegram_id, seller_notification(row.title, row.price))
+                await session.commit()
+                return PurchaseResult(
+                    status=PurchaseStatus.completed,
+                    card_id=card_id,
+                    buyer_id=buyer_id,
+                    seller_id=row.seller_id,
+                    title=row.title,
+                    price=row.price,
+                    seller_telegram_id=row.seller_telegram_id,
+                    purchase_id=row.purchase_id,
+                )
+
+            await session.rollback()
+            return PurchaseResult(
+                status=await self._diagnose(session, card_id, buyer_id),
+                card_id=card_id,
+            )
+
+    @staticmethod
+    def _purchase_statement(card_id: int, buyer_id: int):
+        # One statement: claim the card, record the purchase and append the buyer debit
+        # and seller credit to the ledger. The buyer row is already locked, so the
+        # balance guard sees every earlier debit; the seller row is never locked.
+        now = datetime.now(timezone.utc)
+
+        claimed = (
+            update(Card)
+            .where(
+                Card.id == card_id,
+                Card.status == CardStatus.approved,
+                Card.owner_id != buyer_id,
+                Card.price <= available_balance(buyer_id),
+            )
+            .values(status=CardStatus.sold, updated_at=now)
+            .returning(Card.id, Card.owner_id, Card.title, Card.price)
+            .cte("claimed")
+        )
+        purchase = (
+            insert(Purchase)
+            .from_select(
+                ["buyer_id", "card_id", "amount", "created_at"],
+                select(literal(buyer_id), claimed.c.id, claimed.c.price, literal(now, Purchase.created_at.type)),
+            )
+            .returning(Purchase.id)
+            .cte("purchase")
+        )
+        kind_type = BalanceLedgerEntry.kind.type
+        created_at = literal(now, BalanceLedgerEntry.created_at.type)
+        entries = (
+            insert(BalanceLedgerEntry)
+            .from_select(
+                ["user_id", "amount", "kind", "reference_id", "folded", "created_at"],
+                union_all(
+                    select(
+                        literal(buyer_id),
+                        -claimed.c.price,
+                        cast(literal(LedgerEntryKind.purchase, kind_type), kind_type),
+                        purchase.c.id,
+                        false(),
+                        created_at,
+                    ).select_from(claimed.join(purchase, true())),
+                    select(
+                        claimed.c.owner_id,
+                        claimed.c.price,
+                        cast(literal(LedgerEntryKind.sale, kind_type), kind_type),
+                        purchase.c.id,
+                        false(),
+                        created_at,
+                    ).select_from(claimed.join(purchase, true())),
+                ),
+            )
+            .returning(BalanceLedgerEntry.id)
+            .cte("entries")
+        )
+        seller_telegram_id = (
+            select(User.telegram_id).where(User.id == claimed.c.owner_id).scalar_subquery()
+        )
+
+        return (
+            select(
+                claimed.c.title,
+                claimed.c.price,
+                claimed.c.owner_id.label("seller_id"),
+                seller_telegram_id.label("seller_telegram_id"),
+                purchase.c.id.label("purchase_id"),
+                select(func.count()).select_from(entries).scalar_subquery().label("entries"),
+            )
+            .select_from(claimed.join(purchase, true()))
+        )
+
+    @staticmethod
+    async def _diagnose(session: AsyncSession, card_id: int, buyer_id: int) -> PurchaseStatus:
+        card = await session.get(Card, card_id)
+        if card is None or card.status != CardStatus.approved:
+            return PurchaseStatus.card_unavailable
+        if card.owner_id == buyer_id:
+            return PurchaseStatus.own_card
+
+        balance = await session.scalar(select(available_balance(buyer_id)))
+        if (balance or 0.0) < card.price:
+            return PurchaseStatus.insufficient_funds
+        return PurchaseStatus.card_unavailable
@@ -0,0 +1,105 @@
+import hashlib
+import hmac
+import json
+import os
+import re
+import time
+from typing import Any, Optional
+
+from misc import BotLogger
+
+logger = BotLogger.get_logger("Recorder")
+
+# Recorded users and chats get ids in their own range, well clear of both real
+# Telegram ids and the load test's synthetic accounts.
+PSEUDONYM_BASE = 8_000_000_000
+PSEUDONYM_SPACE = 1_000_000_000
+
+# Texts that drive routing and carry nothing personal are kept verbatim.
+KEPT_TEXTS = frozenset({"Отмена"})
+_NUMBER = re.compile(r"\d{1,7}(?:[.,]\d{1,2})?")
+
+_NAME_FIELDS = ("first_name", "last_name", "username", "title", "bio", "description")
+_DROPPED_FIELDS = frozenset({
+    "contact", "location", "venue", "passport_data", "shipping_address", "order_info",
+    "phone_number", "email", "url", "active_usernames",
+})
+
+
+class UpdateRecorder:
+    # Appends updates to a JSONL file with people and their words pseudonymised;
+    # the ids stay consistent within a recording, so per-user ordering and FSM
+    # dialogs replay the way they happened.
+
+    def __init__(self, path: str, salt: str = "", flush_every: int = 100) -> None:
+        self._path = path
+        self._salt = salt.encode() or os.urandom(16)
+        self._flush_every = flush_every
+        self._pending = 0
+        self._file = open(path, "a", encoding="utf-8")
+        logger.info(f"Recording updates to {path}")
+
+    def record(self, update: dict[str, Any]) -> None:
+        line = json.dumps({"at": time.time(), "update": self._anonymize(update)}, ensure_ascii=False)
+        self._file.write(line + "\n")
+        self._pending += 1
+        if self._pending >= self._flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        self._file.flush()
+        self._pending = 0
+
+    def close(self) -> None:
+        self._file.close()
+
+    def _pseudonym(self, value: int) -> int:
+        digest = hmac.new(self._salt, str(abs(value)).encode(), hashlib.sha256).digest()
+        pseudonym = PSEUDONYM_BASE + int.from_bytes(digest[:8], "big") % PSEUDONYM_SPACE
+        # Group and channel ids are negative; the sign tells the chat type apart.
+        return -pseudonym if value < 0 else pseudonym
+
+    def _token(self, value: str) -> str:
+        return hmac.new(self._salt, value.encode(), hashlib.sha256).hexdigest()[:32]
+
+    @staticmethod
+    def _mask(text: str) -> str:
+        if text.startswith("/") or text in KEPT_TEXTS or _NUMBER.fullmatch(text):
+            return text
+        # Length is kept, it matters for rendering and storage costs.
+        return re.sub(r"\S", "x", text)
+
+    def _anonymize(self, value: Any) -> Any:
+        if isinstance(value, list):
+            return [self._anonymize(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+
+        result: dict[str, Any] = {}
+        is_party = "id" in value and ("first_name" in value or "type" in value)
+        for key, item in value.items():
+            if key in _DROPPED_FIELDS:
+                continue
+            if is_party and key == "id" and isinstance(item, int):
+                result[key] = self._pseudonym(item)
+            elif is_party and key in _NAME_FIELDS and isinstance(item, str):
+                result[key] = f"{key}_{self._token(item)[:8]}"
+            elif key in ("text", "caption") and isinstance(item, str):
+                result[key] = self._mask(item)
+            elif key in ("file_id", "file_unique_id", "chat_instance") and isinstance(item, str):
+                result[key] = self._token(item)
+            elif key in ("user_id", "chat_id", "sender_chat_id") and isinstance(item, int):
+                result[key] = self._pseudonym(item)
+            else:
+                result[key] = self._anonymize(item)
+        return result
+
+
+def open_recorder(path: str, salt: str = "") -> Optional[UpdateRecorder]:
+    if not path:
+        return None
+    try:
+        return UpdateRecorder(path, salt)
+    except OSError as e:
+        logger.error(f"Update recording disabled, cannot open {path}: {e}")
+        return None
@@ -0,0 +1,54 @@
+import asyncio
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from misc import BotLogger
+from .database import User
+from .inmemory import AsyncRedisCache
+
+logger = BotLogger.get_logger("Roles")
+
+
+class AdminRoles:
+    # Admins are granted by setting users.is_admin in the database and publishing
+    # on CHANNEL; every instance reloads on the signal, and within refresh_interval
+    # seconds if it was missed.
+    CHANNEL = "roles:changed"
+
+    def __init__(
+        self,
+        async_sessionmaker: async_sessionmaker[AsyncSession],
+        cache: AsyncRedisCache,
+        refresh_interval: float = 60.0,
+    ) -> None:
+        self._async_sessionmaker = async_sessionmaker
+        self._cache = cache
+        self._refresh_interval = refresh_interval
+        self._admin_ids: frozenset[int] = frozenset()
+
+    def is_admin(self, telegram_id: int) -> bool:
+        return telegram_id in self._admin_ids
+
+    async def init(self) -> None:
+        await self.reload()
+        await self._cache.subscribe(self.CHANNEL, self._on_changed)
+
+    async def reload(self) -> None:
+        async with self._async_sessionmaker() as session:
+            result = await session.execute(select(User.telegram_id).where(User.is_admin))
+            admin_ids = frozenset(result.scalars().all())
+        if admin_ids != self._admin_ids:
+            logger.info(f"Loaded {len(admin_ids)} admins")
+        self._admin_ids = admin_ids
+
+    async def _on_changed(self, _: str) -> None:
+        await self.reload()
+
+    async def run_refresher(self) -> None:
+        while True:
+            await asyncio.sleep(self._refresh_interval)
+            try:
+                await self.reload()
+            except Exception as e:
+                logger.error(f"Failed to refresh admin roles: {e}")
@@ -0,0 +1,140 @@
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from misc import BotLogger
+from .metrics import updates_shed_total, updates_waiting
+
+logger = BotLogger.get_logger("Scheduler")
+
+# Read-only screens: re-running one with the same callback data shows the same
+# thing, so a repeated click still waiting in the queue adds nothing.
+NAV_ACTIONS = frozenset({
+    "cards_prev", "cards_next", "show_products", "back", "balance",
+    "menu", "moderation", "stats", "withdraws", "mod_prev", "mod_next", "wd_prev", "wd_next",
+})
+
+
+def update_user_key(update: Update) -> Optional[int]:
+    event = update.event
+    from_user = getattr(event, "from_user", None)
+    if from_user is not None:
+        return from_user.id
+    chat = getattr(event, "chat", None)
+    return chat.id if chat is not None else None
+
+
+def navigation_key(update: Update) -> Optional[Hashable]:
+    callback = update.callback_query
+    if callback is None or not callback.data or callback.message is None:
+        return None
+    parts = callback.data.split("-")
+    if callback.data != "noop" and (len(parts) < 2 or parts[1] not in NAV_ACTIONS):
+        return None
+    return callback.message.message_id, callback.data
+
+
+class _Slot:
+    __slots__ = ("turn", "merge_key")
+
+    def __init__(self, merge_key: Optional[Hashable]) -> None:
+        self.turn = asyncio.get_running_loop().create_future()
+        self.merge_key = merge_key
+
+
+class UpdateScheduler:
+
+    def __init__(self, max_concurrency: int = 64, user_queue_size: int = 5, max_pending: int = 2000) -> None:
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._user_queue_size = user_queue_size
+        self._max_pending = max_pending
+        self._pending = 0
+        self._lanes: dict[int, deque[_Slot]] = {}
+
+    async def submit(
+        self,
+        update: Update,
+        process: Callable[[], Awaitable[Any]],
+        on_drop: Callable[[], Awaitable[None]],
+    ) -> Any:
+        if self._pending >= self._max_pending:
+            return await self._drop("overload", on_drop)
+
+        key = update_user_key(update)
+        if key is None:
+            return await self._run(process)
+
+        lane = self._lanes.setdefault(key, deque())
+        merge_key = navigation_key(update)
+        # lane[0] is already running; only updates still waiting can absorb a repeat.
+        if merge_key is not None and any(slot.merge_key == merge_key for slot in list(lane)[1:]):
+            return await self._drop("merged", on_drop)
+        if len(lane) > self._user_queue_size:
+            return await self._drop("user_queue", on_drop)
+
+        slot = _Slot(merge_key)
+        lane.append(slot)
+        if len(lane) == 1:
+            slot.turn.set_result(None)
+
+        self._pending += 1
+        updates_waiting.inc()
+        waiting = True
+        try:
+            # Each update runs in its own task and context; the lane only decides
+            # when its turn comes, so one user's updates never overlap or reorder.
+            await slot.turn
+            waiting = False
+            updates_waiting.dec()
+            return await self._run(process)
+        finally:
+            if waiting:
+                updates_waiting.dec()
+            self._pending -= 1
+            self._release(key, lane, slot)
+
+    async def _run(self, process: Callable[[], Awaitable[Any]]) -> Any:
+        async with self._semaphore:
+            return await process()
+
+    def _release(self, key: int, lane: deque[_Slot], slot: _Slot) -> None:
+        was_head = lane[0] is slot
+        lane.remove(slot)
+        if not lane:
+            self._lanes.pop(key, None)
+        elif was_head:
+            lane[0].turn.set_result(None)
+
+    @staticmethod
+    async def _drop(reason: str, on_drop: Callable[[], Awaitable[None]]) -> None:
+        updates_shed_total.labels(reason).inc()
+        try:
+            await on_drop()
+        except Exception as e:
+            logger.debug(f"Failed to acknowledge a dropped update: {e}")
+        return None
+
+
+class SchedulingDispatcher(Dispatcher):
+    # Every transport (polling, webhook, stream workers) enters through feed_update,
+    # so scheduling here puts it in front of all middlewares, the FSM read included.
+
+    def __init__(self, *, scheduler: UpdateScheduler, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.scheduler = scheduler
+
+    async def feed_update(self, bot: Bot, update: Update, **kwargs: Any) -> Any:
+        return await self.scheduler.submit(
+            update,
+            lambda: super(SchedulingDispatcher, self).feed_update(bot, update, **kwargs),
+            lambda: self._acknowledge_dropped(bot, update),
+        )
+
+    @staticmethod
+    async def _acknowledge_dropped(bot: Bot, update: Update) -> None:
+        # A dropped button press still has to stop the client's loading spinner.
+        if update.callback_query is not None:
+            await bot.answer_callback_query(update.callback_query.id)
@@ -12,6 +12,10 @@ class WithdrawStates(StatesGroup):
     waiting_requisites = State()
 
 
+class AdminBroadcastStates(StatesGroup):
+    waiting_text = State()
+
+
 class AdminEditCardStates(StatesGroup):
     waiting_field_choice = State()
     waiting_new_value = State()
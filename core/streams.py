@@ -0,0 +1,251 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+from typing import Any, Callable, Optional
+
+import redis.asyncio as redis
+from aiogram import Bot, Dispatcher
+from redis.exceptions import ResponseError
+
+from misc import BotLogger
+from .metrics import stream_updates_ingested_total, stream_updates_processed_total
+
+logger = BotLogger.get_logger("Streams")
+
+GROUP = "update-workers"
+
+
+def stream_key(shard: int) -> str:
+    return f"updates:{shard}"
+
+
+def update_chat_id(update: dict[str, Any]) -> Optional[int]:
+    for field in ("message", "edited_message", "channel_post", "edited_channel_post", "business_message"):
+        if field in update:
+            return update[field]["chat"]["id"]
+    callback = update.get("callback_query")
+    if callback is not None:
+        message = callback.get("message")
+        if message is not None:
+            return message["chat"]["id"]
+        return callback["from"]["id"]
+    for field in ("my_chat_member", "chat_member", "chat_join_request", "message_reaction"):
+        if field in update:
+            return update[field]["chat"]["id"]
+    # Inline queries, polls, payments and the like are keyed by their sender.
+    for value in update.values():
+        if isinstance(value, dict) and isinstance(value.get("from"), dict):
+            return value["from"]["id"]
+    return None
+
+
+def shard_for(chat_id: Optional[int], shards: int) -> int:
+    # Updates of one chat always land on the same stream, so they are consumed in
+    # the order Telegram delivered them.
+    return abs(chat_id or 0) % shards
+
+
+class UpdateIngest:
+
+    def __init__(self, redis_client: redis.Redis, shards: int, maxlen: int = 100_000) -> None:
+        self._redis = redis_client
+        self._shards = shards
+        self._maxlen = maxlen
+
+    async def publish(self, update: dict[str, Any]) -> None:
+        shard = shard_for(update_chat_id(update), self._shards)
+        await self._redis.xadd(
+            stream_key(shard),
+            {"update": json.dumps(update, ensure_ascii=False)},
+            maxlen=self._maxlen,
+            approximate=True,
+        )
+        stream_updates_ingested_total.labels(str(shard)).inc()
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+class StreamWorker:
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        shards: list[int],
+        consumer: str,
+        batch_size: int = 50,
+        block_ms: int = 5000,
+        max_in_flight: int = 200,
+    ) -> None:
+        self._redis = redis_client
+        self._dispatcher = dispatcher
+        self._bot = bot
+        self._shards = shards
+        self._consumer = consumer
+        self._batch_size = batch_size
+        self._block_ms = block_ms
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+
+    async def run(self) -> None:
+        if not self._shards:
+            logger.warning(f"Consumer {self._consumer} has no shards: STREAM_SHARDS is below the worker count")
+            await asyncio.Event().wait()
+        logger.info(f"Consumer {self._consumer} reading shards {self._shards}")
+        await asyncio.gather(*(self._consume(shard) for shard in self._shards))
+
+    async def _consume(self, shard: int) -> None:
+        stream = stream_key(shard)
+        await self._ensure_group(stream)
+        lanes: dict[Optional[int], asyncio.Task] = {}
+
+        # Entries this consumer read but never acknowledged (it was killed mid-update)
+        # are replayed first; consumer names are stable per shard set, so nothing is lost.
+        # While replaying, the cursor walks the pending list past what is in flight.
+        last_id = "0"
+        while True:
+            try:
+                response = await self._redis.xreadgroup(
+                    GROUP,
+                    self._consumer,
+                    {stream: last_id},
+                    count=self._batch_size,
+                    block=None if last_id != ">" else self._block_ms,
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Failed to read {stream}: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            entries = response[0][1] if response else []
+            if not entries:
+                last_id = ">"
+                continue
+            if last_id != ">":
+                last_id = entries[-1][0]
+
+            for entry_id, fields in entries:
+                await self._in_flight.acquire()
+                update = self._decode(shard, fields)
+                chat_id = update_chat_id(update) if update else None
+                self._dispatch(lanes, chat_id, stream, shard, entry_id, update)
+
+    def _dispatch(
+        self,
+        lanes: dict[Optional[int], asyncio.Task],
+        chat_id: Optional[int],
+        stream: str,
+        shard: int,
+        entry_id: bytes,
+        update: Optional[dict[str, Any]],
+    ) -> None:
+        # One chat's entries are chained, so its next FSM step never starts before
+        # the previous one finished; different chats of a shard run side by side,
+        # and a chat stuck behind Bot API limits only holds up itself.
+        task = asyncio.create_task(
+            self._process_after(lanes.get(chat_id), stream, shard, entry_id, update)
+        )
+        lanes[chat_id] = task
+
+        def forget(done: asyncio.Task) -> None:
+            if lanes.get(chat_id) is done:
+                del lanes[chat_id]
+
+        task.add_done_callback(forget)
+
+    async def _process_after(
+        self,
+        previous: Optional[asyncio.Task],
+        stream: str,
+        shard: int,
+        entry_id: bytes,
+        update: Optional[dict[str, Any]],
+    ) -> None:
+        try:
+            if previous is not None:
+                await asyncio.gather(previous, return_exceptions=True)
+            if update is not None:
+                await self._process(shard, update)
+            await self._redis.xack(stream, GROUP, entry_id)
+        except Exception as e:
+            logger.error(f"Failed to acknowledge {entry_id!r} on {stream}: {e}")
+        finally:
+            self._in_flight.release()
+
+    @staticmethod
+    def _decode(shard: int, fields: Optional[dict[bytes, bytes]]) -> Optional[dict[str, Any]]:
+        if not fields or b"update" not in fields:
+            return None
+        try:
+            return json.loads(fields[b"update"])
+        except ValueError as e:
+            stream_updates_processed_total.labels(str(shard), "error").inc()
+            logger.error(f"Undecodable entry on shard {shard}: {e}")
+            return None
+
+    async def _process(self, shard: int, update: dict[str, Any]) -> None:
+        try:
+            await self._dispatcher.feed_raw_update(self._bot, update)
+            stream_updates_processed_total.labels(str(shard), "ok").inc()
+        except Exception as e:
+            # A poisoned update is dropped rather than blocking its chat.
+            stream_updates_processed_total.labels(str(shard), "error").inc()
+            logger.exception(f"Update from shard {shard} failed: {e}")
+
+    async def _ensure_group(self, stream: str) -> None:
+        try:
+            await self._redis.xgroup_create(stream, GROUP, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+
+def worker_shards(global_index: int, total_workers: int, shards: int) -> list[int]:
+    return [shard for shard in range(shards) if shard % total_workers == global_index]
+
+
+def consumer_name(global_index: int) -> str:
+    return f"worker-{global_index}"
+
+
+class WorkerPool:
+
+    def __init__(self, target: Callable[[int], None], workers: int, node_index: int = 0) -> None:
+        self._target = target
+        self._workers = workers
+        self._node_index = node_index
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: dict[int, multiprocessing.process.BaseProcess] = {}
+
+    def start(self) -> None:
+        for local_index in range(self._workers):
+            self._spawn(local_index)
+
+    async def supervise(self, interval: float = 5.0) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            for local_index, process in list(self._processes.items()):
+                if not process.is_alive():
+                    logger.error(f"Worker {local_index} exited with {process.exitcode}, restarting")
+                    self._spawn(local_index)
+
+    def stop(self) -> None:
+        for process in self._processes.values():
+            process.terminate()
+        for process in self._processes.values():
+            process.join(timeout=10)
+
+    def _spawn(self, local_index: int) -> None:
+        global_index = self._node_index * self._workers + local_index
+        process = self._context.Process(
+            target=self._target,
+            args=(global_index,),
+            name=f"{socket.gethostname()}-{os.getpid()}-worker-{global_index}",
+        )
+        process.start()
+        self._processes[local_index] = process
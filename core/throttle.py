@@ -0,0 +1,204 @@
+import asyncio
+import enum
+import heapq
+import itertools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from misc import BotLogger
+from .metrics import bot_api_queue_depth, bot_api_retry_after_total, bot_api_wait_seconds
+
+logger = BotLogger.get_logger("Throttle")
+
+
+class CallPriority(enum.IntEnum):
+    interactive = 0
+    bulk = 1
+
+
+_call_priority: ContextVar[CallPriority] = ContextVar("bot_call_priority", default=CallPriority.interactive)
+
+
+@contextmanager
+def bulk_priority() -> Iterator[None]:
+    token = _call_priority.set(CallPriority.bulk)
+    try:
+        yield
+    finally:
+        _call_priority.reset(token)
+
+
+class TokenBucket:
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        # The pump reads the clock before it creates a chat's bucket, so `now` can
+        # trail updated_at; a negative span must not drain tokens.
+        elapsed = max(0.0, now - self.updated_at)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated_at = max(self.updated_at, now)
+
+    def delay(self, now: float) -> float:
+        self._refill(now)
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self) -> None:
+        self.tokens -= 1
+
+    def pause(self, now: float, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, now + seconds)
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.paused_until
+
+
+class BotCallScheduler:
+    MAX_IDLE_BUCKETS = 10_000
+
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        chat_burst: int = 3,
+        group_rate: float = 20 / 60,
+    ) -> None:
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chat_rate = chat_rate
+        self._chat_burst = chat_burst
+        self._group_rate = group_rate
+        self._chats: dict[int, TokenBucket] = {}
+        self._waiters: list[tuple[int, int, Optional[int], asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._pump_task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+
+    async def acquire(self, chat_id: Optional[int], priority: CallPriority) -> None:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), chat_id, future))
+        bot_api_queue_depth.labels(priority.name).inc()
+        started = time.monotonic()
+        self._kick()
+        try:
+            await future
+        finally:
+            bot_api_queue_depth.labels(priority.name).dec()
+            bot_api_wait_seconds.labels(priority.name).observe(time.monotonic() - started)
+
+    def pause(self, chat_id: Optional[int], seconds: float) -> None:
+        now = time.monotonic()
+        bucket = self._global if chat_id is None else self._chat_bucket(chat_id)
+        bucket.pause(now, seconds)
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.MAX_IDLE_BUCKETS:
+                now = time.monotonic()
+                self._chats = {k: b for k, b in self._chats.items() if not b.idle(now)}
+            # Groups are limited per minute, private chats per second.
+            rate = self._group_rate if chat_id < 0 else self._chat_rate
+            bucket = TokenBucket(rate, self._chat_burst if chat_id > 0 else 1)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _kick(self) -> None:
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.create_task(self._pump())
+        else:
+            self._wakeup.set()
+
+    async def _pump(self) -> None:
+        while self._waiters:
+            now = time.monotonic()
+            next_wake = None
+            pending = []
+
+            # Interactive calls first, FIFO within a priority. A waiter whose chat is
+            # still cooling down does not block waiters for other chats behind it.
+            while self._waiters:
+                entry = heapq.heappop(self._waiters)
+                _, _, chat_id, future = entry
+                if future.done():
+                    continue
+
+                global_delay = self._global.delay(now)
+                if global_delay > 0:
+                    pending.append(entry)
+                    next_wake = global_delay
+                    break
+
+                bucket = self._chat_bucket(chat_id) if chat_id is not None else None
+                chat_delay = bucket.delay(now) if bucket else 0.0
+                if chat_delay > 0:
+                    pending.append(entry)
+                    next_wake = chat_delay if next_wake is None else min(next_wake, chat_delay)
+                    continue
+
+                self._global.consume()
+                if bucket:
+                    bucket.consume()
+                future.set_result(None)
+
+            for entry in pending:
+                heapq.heappush(self._waiters, entry)
+
+            if not self._waiters:
+                break
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=next_wake)
+            except asyncio.TimeoutError:
+                pass
+
+
+class ThrottlingRequestMiddleware(BaseRequestMiddleware):
+
+    def __init__(self, scheduler: BotCallScheduler, max_retries: int = 3) -> None:
+        self._scheduler = scheduler
+        self._max_retries = max_retries
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        # Only chat-bound calls count against Telegram's flood limits; getUpdates,
+        # answerCallbackQuery and friends pass straight through.
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+        if not isinstance(chat_id, int):
+            chat_id = None
+
+        attempt = 0
+        while True:
+            await self._scheduler.acquire(chat_id, _call_priority.get())
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                bot_api_retry_after_total.inc()
+                if attempt >= self._max_retries:
+                    raise
+                attempt += 1
+                logger.warning(f"Flood limit on chat {chat_id}, retrying in {e.retry_after}s")
+                self._scheduler.pause(chat_id, e.retry_after)
@@ -0,0 +1,64 @@
+import inspect
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from misc import BotLogger
+
+logger = BotLogger.get_logger("UnitOfWork")
+
+CommitHook = Callable[[], Optional[Awaitable[None]]]
+
+
+class UnitOfWork:
+
+    def __init__(self, async_sessionmaker: async_sessionmaker[AsyncSession]) -> None:
+        self._async_sessionmaker = async_sessionmaker
+        self._session: Optional[AsyncSession] = None
+        self._on_commit: list[CommitHook] = []
+
+    @property
+    def active(self) -> bool:
+        return self._session is not None
+
+    async def session(self) -> AsyncSession:
+        # The connection is only checked out once a handler actually touches the DB.
+        if self._session is None:
+            self._session = self._async_sessionmaker()
+            await self._session.begin()
+        return self._session
+
+    def on_commit(self, hook: CommitHook) -> None:
+        self._on_commit.append(hook)
+
+    async def commit(self) -> None:
+        # Handlers may commit early to release the connection before talking to
+        # Telegram; a later session() call starts a fresh transaction.
+        if self._session is None:
+            return
+        try:
+            await self._session.commit()
+        finally:
+            await self._close()
+
+        hooks, self._on_commit = self._on_commit, []
+        for hook in hooks:
+            try:
+                result = hook()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"On-commit hook failed: {e}")
+
+    async def rollback(self) -> None:
+        self._on_commit.clear()
+        if self._session is None:
+            return
+        try:
+            await self._session.rollback()
+        finally:
+            await self._close()
+
+    async def _close(self) -> None:
+        session, self._session = self._session, None
+        await session.close()
@@ -6,6 +6,11 @@ from misc import BotLogger
 import core.di as di
 
 class Utils:
+    @staticmethod
+    def is_admin(telegram_id: int) -> bool:
+        # The role set is refreshed on every change; the cached user row is not.
+        return di.roles is not None and di.roles.is_admin(telegram_id)
+
     @staticmethod
     async def answer(
         t_object: Message | CallbackQuery,
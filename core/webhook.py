@@ -0,0 +1,135 @@
+import asyncio
+import json
+import time
+from contextvars import ContextVar
+from typing import Any, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from misc import BotLogger
+from .metrics import update_reply_seconds, webhook_rejected_total
+
+logger = BotLogger.get_logger("Webhook")
+
+
+class _Receipt:
+    __slots__ = ("received_at", "replied")
+
+    def __init__(self) -> None:
+        self.received_at = time.monotonic()
+        self.replied = False
+
+
+_receipt: ContextVar[Optional[_Receipt]] = ContextVar("update_receipt", default=None)
+
+
+class ReplyLatencyMiddleware(BaseRequestMiddleware):
+    # Bot API calls made while handling an update inherit its receipt; the first
+    # successful one is the reply the user sees.
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        response = await make_request(bot, method)
+        receipt = _receipt.get()
+        if receipt is not None and not receipt.replied:
+            receipt.replied = True
+            update_reply_seconds.observe(time.monotonic() - receipt.received_at)
+        return response
+
+
+class WebhookRequestHandler(SimpleRequestHandler):
+
+    @staticmethod
+    async def _read_update(bot: Bot, request: web.Request) -> dict[str, Any] | web.Response:
+        try:
+            update = await request.json(loads=bot.session.json_loads)
+        except (json.JSONDecodeError, ValueError):
+            webhook_rejected_total.labels("malformed").inc()
+            return web.Response(status=400, text="Malformed JSON")
+        if not isinstance(update, dict) or not isinstance(update.get("update_id"), int):
+            webhook_rejected_total.labels("invalid").inc()
+            return web.Response(status=400, text="Not a Telegram update")
+        return update
+
+    async def _handle_request(self, bot: Bot, request: web.Request) -> web.Response:
+        update = await self._read_update(bot, request)
+        if isinstance(update, web.Response):
+            return update
+        result = await self.dispatcher.feed_webhook_update(bot, update, **self.data)
+        return web.Response(body=self._build_response_writer(bot=bot, result=result))
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        update = await self._read_update(bot, request)
+        if isinstance(update, web.Response):
+            return update
+
+        # Telegram only needs the 200; the update is processed in its own task,
+        # which inherits the receipt through the copied context.
+        token = _receipt.set(_Receipt())
+        try:
+            task = asyncio.create_task(self._background_feed_update(bot=bot, update=update))
+        finally:
+            _receipt.reset(token)
+        self._background_feed_update_tasks.add(task)
+        task.add_done_callback(self._background_feed_update_tasks.discard)
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        response = await super().handle(request)
+        if response.status == 401:
+            webhook_rejected_total.labels("secret").inc()
+        return response
+
+
+async def run_webhook(
+    dispatcher: Dispatcher,
+    bot: Bot,
+    host: str,
+    port: int,
+    path: str,
+    base_url: str = "",
+    secret_token: str = "",
+    allowed_updates: Optional[list[str]] = None,
+    handle_in_background: bool = True,
+) -> None:
+    if handle_in_background:
+        bot.session.middleware(ReplyLatencyMiddleware())
+
+    app = web.Application()
+    WebhookRequestHandler(
+        dispatcher,
+        bot,
+        handle_in_background=handle_in_background,
+        secret_token=secret_token or None,
+    ).register(app, path=path)
+    setup_application(app, dispatcher, bot=bot)
+
+    if base_url:
+        await bot.set_webhook(
+            url=base_url.rstrip("/") + path,
+            secret_token=secret_token or None,
+            allowed_updates=allowed_updates or dispatcher.resolve_used_update_types(),
+            drop_pending_updates=False,
+        )
+    else:
+        # Without a public URL the server only takes updates POSTed to it directly,
+        # e.g. recorded ones replayed locally.
+        logger.warning("WEBHOOK_BASE_URL is empty, webhook is not registered with Telegram")
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=host, port=port)
+    await site.start()
+    logger.info(f"Listening for webhook updates on {host}:{port}{path}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -0,0 +1,104 @@
+import argparse
+import asyncio
+import json
+
+from .fake_api import FakeBotAPI
+from .harness import compare, run_load, save
+from .replay import run_replay
+
+
+def _speed(value: str) -> float | None:
+    if value == "max":
+        return None
+    speed = float(value.rstrip("x"))
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive or 'max'")
+    return speed
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m loadtest")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="drive synthetic users through the bot")
+    run.add_argument("--users", type=int, default=50)
+    run.add_argument("--duration", type=float, default=60.0)
+    run.add_argument("--think-time", type=float, default=0.5)
+    run.add_argument("--latency", type=float, default=0.03, help="simulated Bot API latency, seconds")
+    run.add_argument("--jitter", type=float, default=0.02)
+    run.add_argument("--rate-limit-ratio", type=float, default=0.0, help="share of Bot API calls answered with 429")
+    run.add_argument("--seed-cards", type=int, default=200)
+    run.add_argument("--api-port", type=int, default=8081)
+    run.add_argument("--output", help="result file, defaults to loadtest/results/<time>-<commit>.json")
+
+    replay = commands.add_parser("replay", help="feed a recorded update stream back through the routers")
+    replay.add_argument("recording", help="JSONL file written with UPDATE_RECORD_PATH")
+    replay.add_argument("--speed", type=_speed, default=1.0, help="1, 10 (or any factor) or max")
+    replay.add_argument("--latency", type=float, default=0.03)
+    replay.add_argument("--jitter", type=float, default=0.02)
+    replay.add_argument("--top-up", type=float, default=0.0, help="balance credited to every recorded sender")
+    replay.add_argument("--max-in-flight", type=int, default=64)
+    replay.add_argument("--api-port", type=int, default=8081)
+    replay.add_argument("--output", help="result file, defaults to loadtest/results/<time>-<commit>.json")
+
+    fake = commands.add_parser("fake-api", help="serve the Bot API stand-in on its own")
+    fake.add_argument("--host", default="127.0.0.1")
+    fake.add_argument("--port", type=int, default=8081)
+    fake.add_argument("--latency", type=float, default=0.03)
+    fake.add_argument("--jitter", type=float, default=0.02)
+    fake.add_argument("--rate-limit-ratio", type=float, default=0.0)
+
+    diff = commands.add_parser("compare", help="compare two saved results")
+    diff.add_argument("baseline")
+    diff.add_argument("current")
+    return parser
+
+
+async def _serve_fake_api(args: argparse.Namespace) -> None:
+    api = FakeBotAPI(latency=args.latency, jitter=args.jitter, rate_limit_ratio=args.rate_limit_ratio)
+    await api.start(host=args.host, port=args.port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await api.stop()
+
+
+def main() -> None:
+    args = _parser().parse_args()
+    if args.command in ("run", "replay"):
+        if args.command == "run":
+            result = asyncio.run(run_load(
+                users=args.users,
+                duration=args.duration,
+                think_time=args.think_time,
+                latency=args.latency,
+                jitter=args.jitter,
+                rate_limit_ratio=args.rate_limit_ratio,
+                seed_cards=args.seed_cards,
+                api_port=args.api_port,
+            ))
+        else:
+            result = asyncio.run(run_replay(
+                args.recording,
+                speed=args.speed,
+                latency=args.latency,
+                jitter=args.jitter,
+                top_up=args.top_up,
+                max_in_flight=args.max_in_flight,
+                api_port=args.api_port,
+            ))
+        path = save(result, args.output)
+        print(f"{result['updates']} updates, {result['throughput_rps']} rps, "
+              f"p99 {result['overall']['p99_ms']} ms -> {path}")
+    elif args.command == "fake-api":
+        try:
+            asyncio.run(_serve_fake_api(args))
+        except KeyboardInterrupt:
+            pass
+    else:
+        with open(args.baseline) as baseline, open(args.current) as current:
+            print("\n".join(compare(json.load(baseline), json.load(current))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from typing import Any, Optional
+
+from aiohttp import web
+
+from misc import BotLogger
+
+logger = BotLogger.get_logger("FakeBotAPI")
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Mini Shop", "username": "mini_shop_bot"}
+
+# Methods answered with a sent or edited message; the rest answer True.
+MESSAGE_METHODS = frozenset({
+    "sendmessage", "sendphoto", "editmessagetext", "editmessagemedia",
+    "editmessagecaption", "editmessagereplymarkup",
+})
+
+
+class FakeBotAPI:
+    # Speaks enough of the Bot API for the routers: every call is recorded,
+    # answered after a simulated network delay and occasionally refused with 429.
+
+    def __init__(
+        self,
+        latency: float = 0.03,
+        jitter: float = 0.02,
+        rate_limit_ratio: float = 0.0,
+        retry_after: int = 1,
+    ) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.calls: Counter[str] = Counter()
+        self.rate_limited: Counter[str] = Counter()
+        self._message_ids: dict[int, int] = {}
+        self._inline: dict[int, dict[str, Any]] = {}
+        self._reply_keyboard: dict[int, bool] = {}
+        self._runner: Optional[web.AppRunner] = None
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8081) -> str:
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host=host, port=port)
+        await site.start()
+        logger.info(f"Fake Bot API listening on {host}:{port}")
+        return f"http://{host}:{port}"
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def inline_message(self, chat_id: int) -> Optional[dict[str, Any]]:
+        # The last message in the chat that carries inline buttons, i.e. what a user
+        # would tap next.
+        return self._inline.get(chat_id)
+
+    def find_button(self, chat_id: int, prefix: str) -> Optional[tuple[int, str]]:
+        message = self._inline.get(chat_id)
+        if message is None:
+            return None
+        for row in message["reply_markup"]["inline_keyboard"]:
+            for button in row:
+                data = button.get("callback_data")
+                if data and data.startswith(prefix):
+                    return message["message_id"], data
+        return None
+
+    def awaits_reply(self, chat_id: int) -> bool:
+        # The bot asked for text input: the cancel reply keyboard is on screen.
+        return self._reply_keyboard.get(chat_id, False)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "calls": dict(self.calls),
+            "rate_limited": dict(self.rate_limited),
+        }
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        params = await self._read_params(request)
+        self.calls[method] += 1
+
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if self.rate_limit_ratio and random.random() < self.rate_limit_ratio:
+            self.rate_limited[method] += 1
+            return web.json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            })
+
+        return web.json_response({"ok": True, "result": self._result(method, params)})
+
+    @staticmethod
+    async def _read_params(request: web.Request) -> dict[str, Any]:
+        if request.content_type == "application/json":
+            return await request.json()
+        params: dict[str, Any] = {}
+        for key, value in (await request.post()).items():
+            if not isinstance(value, str):
+                continue
+            # Nested objects (reply_markup, media) arrive JSON-encoded in form fields.
+            if value[:1] in ("{", "["):
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    pass
+            params[key] = value
+        return params
+
+    def _result(self, method: str, params: dict[str, Any]) -> Any:
+        if method == "getme":
+            return BOT_USER
+        if method not in MESSAGE_METHODS:
+            return True
+
+        chat_id = int(params.get("chat_id") or 0)
+        if method.startswith("send"):
+            message_id = self._message_ids.get(chat_id, 0) + 1
+            self._message_ids[chat_id] = message_id
+        else:
+            message_id = int(params.get("message_id") or 0)
+
+        message: dict[str, Any] = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+        }
+        if method in ("sendphoto", "editmessagemedia"):
+            file_id = params.get("photo") or (params.get("media") or {}).get("media") or "photo"
+            message["photo"] = [{"file_id": str(file_id), "file_unique_id": "u", "width": 1, "height": 1}]
+            message["caption"] = params.get("caption") or (params.get("media") or {}).get("caption", "")
+        else:
+            message["text"] = params.get("text", "")
+
+        markup = params.get("reply_markup")
+        if isinstance(markup, dict) and "inline_keyboard" in markup:
+            message["reply_markup"] = markup
+            self._inline[chat_id] = message
+        elif isinstance(markup, dict) and method.startswith("send"):
+            self._reply_keyboard[chat_id] = "keyboard" in markup
+        return message
@@ -0,0 +1,281 @@
+import asyncio
+import json
+import math
+import subprocess
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import TelegramObject
+from sqlalchemy.event import listen
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from core.config import settings
+from core.database import Card, CardStatus
+from core.middleware import handler_name
+from misc import BotLogger
+import core.di as di
+from .fake_api import FakeBotAPI
+from .users import TELEGRAM_ID_BASE, SyntheticUser, pick_flow
+
+logger = BotLogger.get_logger("LoadTest")
+
+SELLER_TELEGRAM_ID = TELEGRAM_ID_BASE - 1
+
+
+class _Probe:
+    __slots__ = ("handler", "queries")
+
+    def __init__(self) -> None:
+        self.handler: Optional[str] = None
+        self.queries = 0
+
+
+_probe: ContextVar[Optional[_Probe]] = ContextVar("load_probe", default=None)
+
+
+class HandlerProbeMiddleware(BaseMiddleware):
+    # Inner middlewares only run once a handler matched, so this is where the
+    # update learns which handler it is attributed to.
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        probe = _probe.get()
+        if probe is not None:
+            probe.handler = handler_name(data["handler"])
+        return await handler(event, data)
+
+
+def count_queries(engine: AsyncEngine) -> None:
+    # SQLAlchemy runs the driver in a greenlet sharing the task's context, so the
+    # statement is charged to the update that issued it.
+    def before_cursor_execute(*args: Any) -> None:
+        probe = _probe.get()
+        if probe is not None:
+            probe.queries += 1
+
+    listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+def percentile(samples: list[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[max(math.ceil(q * len(ordered)) - 1, 0)]
+
+
+def summarize(samples: list[float], errors: int = 0, queries: Optional[list[int]] = None) -> dict[str, Any]:
+    queries = queries or []
+    return {
+        "count": len(samples),
+        "errors": errors,
+        "queries_per_update": round(sum(queries) / len(queries), 2) if queries else 0.0,
+        "max_queries": max(queries) if queries else 0,
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 2) if samples else 0.0,
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2) if samples else 0.0,
+    }
+
+
+class LatencyStats:
+
+    def __init__(self) -> None:
+        self.samples: dict[str, list[float]] = defaultdict(list)
+        self.queries: dict[str, list[int]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+
+    def add(self, handler: str, seconds: float, failed: bool, queries: int = 0) -> None:
+        self.samples[handler].append(seconds)
+        self.queries[handler].append(queries)
+        if failed:
+            self.errors[handler] += 1
+
+    def report(self, elapsed: float) -> dict[str, Any]:
+        every = [s for samples in self.samples.values() for s in samples]
+        every_queries = [q for queries in self.queries.values() for q in queries]
+        return {
+            "updates": len(every),
+            "throughput_rps": round(len(every) / elapsed, 2) if elapsed else 0.0,
+            "overall": summarize(every, sum(self.errors.values()), every_queries),
+            "handlers": {
+                name: summarize(samples, self.errors.get(name, 0), self.queries[name])
+                for name, samples in sorted(self.samples.items())
+            },
+        }
+
+
+def code_version() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def seed(cards: int, users: int, top_up: float) -> None:
+    # Sellers' cards to browse and buy, and enough balance on every synthetic
+    # account for purchases and withdrawals to take their full path.
+    seller, _ = await di.repo.register_user(SELLER_TELEGRAM_ID, "load_seller")
+    now = datetime.now(timezone.utc)
+    async with di.db.async_sessionmaker() as session:
+        async with session.begin():
+            session.add_all(
+                Card(
+                    owner_id=seller.id,
+                    title=f"Load card {i}",
+                    description="Seeded by the load test",
+                    price=10 + i % 90,
+                    status=CardStatus.approved,
+                    created_at=now,
+                    updated_at=now,
+                )
+                for i in range(cards)
+            )
+    await di.approved_counter.reconcile()
+
+    for index in range(users):
+        user, _ = await di.repo.register_user(TELEGRAM_ID_BASE + index, f"load_{index}")
+        await di.ledger.top_up(user.id, top_up)
+
+
+async def start_bot(api: FakeBotAPI, api_port: int) -> Dispatcher:
+    # The real dispatcher and routers, talking to the stand-in instead of Telegram.
+    from main import build_dispatcher, main_router
+
+    settings.telegram_api_base = await api.start(port=api_port)
+    await di.init()
+    dispatcher = build_dispatcher()
+    main_router.message.middleware(HandlerProbeMiddleware())
+    main_router.callback_query.middleware(HandlerProbeMiddleware())
+    count_queries(di.db.engine)
+    return dispatcher
+
+
+async def stop_bot(api: FakeBotAPI) -> None:
+    await di.bot.session.close()
+    await api.stop()
+
+
+def make_feed(dispatcher: Dispatcher, stats: LatencyStats) -> Callable[[dict[str, Any]], Awaitable[None]]:
+    async def feed(update: dict[str, Any]) -> None:
+        probe = _Probe()
+        token = _probe.set(probe)
+        started = time.perf_counter()
+        failed = False
+        try:
+            await dispatcher.feed_raw_update(di.bot, update)
+        except Exception as e:
+            failed = True
+            logger.error(f"Update {update.get('update_id')} failed: {e}")
+        finally:
+            _probe.reset(token)
+        stats.add(probe.handler or "unhandled", time.perf_counter() - started, failed, probe.queries)
+
+    return feed
+
+
+async def run_load(
+    users: int = 50,
+    duration: float = 60.0,
+    think_time: float = 0.5,
+    latency: float = 0.03,
+    jitter: float = 0.02,
+    rate_limit_ratio: float = 0.0,
+    seed_cards: int = 200,
+    top_up: float = 10_000.0,
+    api_port: int = 8081,
+) -> dict[str, Any]:
+    api = FakeBotAPI(latency=latency, jitter=jitter, rate_limit_ratio=rate_limit_ratio)
+    dispatcher = await start_bot(api, api_port)
+
+    await seed(seed_cards, users, top_up)
+    background = [
+        asyncio.create_task(di.ledger.run_folder()),
+        asyncio.create_task(di.outbox.run()),
+    ]
+
+    stats = LatencyStats()
+    feed = make_feed(dispatcher, stats)
+
+    deadline = time.monotonic() + duration
+
+    async def drive(user: SyntheticUser) -> None:
+        while time.monotonic() < deadline:
+            await pick_flow(user)()
+
+    logger.info(f"Load test: {users} users for {duration}s")
+    started = time.monotonic()
+    try:
+        await asyncio.gather(*(drive(SyntheticUser(i, api, feed, think_time)) for i in range(users)))
+    finally:
+        elapsed = time.monotonic() - started
+        for task in background:
+            task.cancel()
+        await stop_bot(api)
+
+    return {
+        "version": code_version(),
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "users": users,
+            "duration_s": duration,
+            "think_time_s": think_time,
+            "api_latency_s": latency,
+            "api_jitter_s": jitter,
+            "rate_limit_ratio": rate_limit_ratio,
+            "seed_cards": seed_cards,
+        },
+        "elapsed_s": round(elapsed, 2),
+        **stats.report(elapsed),
+        "bot_api": api.stats(),
+    }
+
+
+def save(result: dict[str, Any], output: Optional[str]) -> Path:
+    if output:
+        path = Path(output)
+    else:
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = Path("loadtest/results") / f"{stamp}-{result['version']}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(result, ensure_ascii=False, indent=2))
+    return path
+
+
+def _delta(old: float, new: float) -> str:
+    if not old:
+        return "n/a"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def compare(baseline: dict[str, Any], current: dict[str, Any]) -> list[str]:
+    lines = [
+        f"{baseline['version']} -> {current['version']}",
+        f"throughput: {baseline['throughput_rps']} -> {current['throughput_rps']} rps "
+        f"({_delta(baseline['throughput_rps'], current['throughput_rps'])})",
+        f"{'handler':<32}{'p50 ms':>18}{'p95 ms':>18}{'p99 ms':>18}{'queries':>18}",
+    ]
+    names = sorted(set(baseline["handlers"]) | set(current["handlers"]))
+    for name in ["overall", *names]:
+        old = baseline["overall"] if name == "overall" else baseline["handlers"].get(name)
+        new = current["overall"] if name == "overall" else current["handlers"].get(name)
+        if old is None or new is None:
+            lines.append(f"{name:<32}{'only in ' + ('current' if old is None else 'baseline'):>18}")
+            continue
+        cells = "".join(
+            f"{new.get(key, 0):>10} {_delta(old.get(key, 0), new.get(key, 0)):>7}"
+            for key in ("p50_ms", "p95_ms", "p99_ms", "queries_per_update")
+        )
+        lines.append(f"{name:<32}{cells}")
+    return lines
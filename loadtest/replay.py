@@ -0,0 +1,102 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from aiogram.types import Update
+
+from core.scheduler import update_user_key
+from misc import BotLogger
+import core.di as di
+from .fake_api import FakeBotAPI
+from .harness import LatencyStats, code_version, make_feed, start_bot, stop_bot
+
+logger = BotLogger.get_logger("Replay")
+
+
+def load_recording(path: str) -> list[tuple[float, dict[str, Any]]]:
+    records = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                record = json.loads(line)
+                records.append((record["at"], record["update"]))
+    records.sort(key=lambda record: record[0])
+    return records
+
+
+async def top_up_senders(records: list[tuple[float, dict[str, Any]]], amount: float) -> None:
+    # Recorded users arrive without a balance; a top-up lets their purchases and
+    # withdrawals run the full path instead of stopping at "insufficient funds".
+    senders = {update_user_key(Update.model_validate(update)) for _, update in records}
+    for telegram_id in senders - {None}:
+        user, _ = await di.repo.register_user(telegram_id, None)
+        await di.ledger.top_up(user.id, amount)
+
+
+async def run_replay(
+    path: str,
+    speed: Optional[float] = 1.0,
+    latency: float = 0.03,
+    jitter: float = 0.02,
+    top_up: float = 0.0,
+    max_in_flight: int = 64,
+    api_port: int = 8081,
+) -> dict[str, Any]:
+    records = load_recording(path)
+    if not records:
+        raise ValueError(f"{path} holds no updates")
+
+    api = FakeBotAPI(latency=latency, jitter=jitter)
+    dispatcher = await start_bot(api, api_port)
+    if top_up:
+        await top_up_senders(records, top_up)
+
+    stats = LatencyStats()
+    feed = make_feed(dispatcher, stats)
+    in_flight = asyncio.Semaphore(max_in_flight)
+    tasks: set[asyncio.Task] = set()
+
+    async def feed_one(update: dict[str, Any]) -> None:
+        try:
+            await feed(update)
+        finally:
+            in_flight.release()
+
+    logger.info(f"Replaying {len(records)} updates from {path} at {f'{speed}x' if speed else 'max speed'}")
+    first_at = records[0][0]
+    started = time.monotonic()
+    try:
+        for at, update in records:
+            if speed:
+                # Updates start at their recorded offsets, compressed by `speed`,
+                # and overlap the way they did in production.
+                delay = started + (at - first_at) / speed - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            # At max speed the in-flight cap is the only pacing.
+            await in_flight.acquire()
+            task = asyncio.create_task(feed_one(update))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+    finally:
+        elapsed = time.monotonic() - started
+        await stop_bot(api)
+
+    return {
+        "version": code_version(),
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "recording": path,
+            "speed": speed or "max",
+            "recorded_span_s": round(records[-1][0] - first_at, 2),
+            "api_latency_s": latency,
+            "api_jitter_s": jitter,
+            "max_in_flight": max_in_flight,
+        },
+        "elapsed_s": round(elapsed, 2),
+        **stats.report(elapsed),
+        "bot_api": api.stats(),
+    }
@@ -0,0 +1,129 @@
+import asyncio
+import itertools
+import random
+import time
+import uuid
+from typing import Any, Awaitable, Callable
+
+from .fake_api import FakeBotAPI
+
+# Synthetic accounts live far above real Telegram ids, so a run against a shared
+# database never collides with real users.
+TELEGRAM_ID_BASE = 7_000_000_000
+
+Feed = Callable[[dict[str, Any]], Awaitable[None]]
+
+_update_ids = itertools.count(1)
+
+
+class SyntheticUser:
+
+    def __init__(self, index: int, api: FakeBotAPI, feed: Feed, think_time: float = 0.5) -> None:
+        self.telegram_id = TELEGRAM_ID_BASE + index
+        self.api = api
+        self.feed = feed
+        self.think_time = think_time
+        self._sender = {
+            "id": self.telegram_id,
+            "is_bot": False,
+            "first_name": f"Load {index}",
+            "username": f"load_{index}",
+        }
+
+    async def send_text(self, text: str) -> None:
+        await self._think()
+        await self.feed({"update_id": next(_update_ids), "message": self._message(text=text)})
+
+    async def send_photo(self) -> None:
+        await self._think()
+        photo = [{"file_id": f"load-photo-{uuid.uuid4().hex}", "file_unique_id": "load", "width": 640, "height": 480}]
+        await self.feed({"update_id": next(_update_ids), "message": self._message(photo=photo)})
+
+    async def press(self, prefix: str) -> bool:
+        button = self.api.find_button(self.telegram_id, prefix)
+        if button is None:
+            return False
+        message_id, data = button
+        await self._think()
+        await self.feed({
+            "update_id": next(_update_ids),
+            "callback_query": {
+                "id": uuid.uuid4().hex,
+                "from": self._sender,
+                "chat_instance": str(self.telegram_id),
+                "data": data,
+                "message": {
+                    "message_id": message_id,
+                    "date": int(time.time()),
+                    "chat": {"id": self.telegram_id, "type": "private"},
+                    "text": "",
+                },
+            },
+        })
+        return True
+
+    async def start(self) -> None:
+        await self.send_text("/start")
+
+    async def browse(self, pages: int = 3) -> None:
+        await self.start()
+        if not await self.press("user-show_products-"):
+            return
+        for _ in range(pages):
+            if not await self.press("user-cards_next-"):
+                break
+
+    async def add_card(self) -> None:
+        await self.start()
+        if not await self.press("user-add_product-"):
+            return
+        await self.send_text(f"Load card {uuid.uuid4().hex[:8]}")
+        await self.send_text("Generated by the load test")
+        await self.send_text(str(random.randint(10, 500)))
+        await self.send_photo()
+
+    async def buy(self) -> None:
+        await self.start()
+        if not await self.press("user-show_products-"):
+            return
+        for _ in range(random.randint(0, 3)):
+            if not await self.press("user-cards_next-"):
+                break
+        await self.press("user-buy-")
+
+    async def withdraw(self) -> None:
+        await self.start()
+        if not await self.press("user-balance-"):
+            return
+        if not await self.press("user-withdraw-"):
+            return
+        if self.api.awaits_reply(self.telegram_id):
+            await self.send_text("4111 1111 1111 1111")
+
+    async def _think(self) -> None:
+        if self.think_time > 0:
+            await asyncio.sleep(random.uniform(0, self.think_time))
+
+    def _message(self, **content: Any) -> dict[str, Any]:
+        return {
+            "message_id": random.randint(1, 2**31 - 1),
+            "date": int(time.time()),
+            "chat": {"id": self.telegram_id, "type": "private"},
+            "from": self._sender,
+            **content,
+        }
+
+
+# Relative weights of the flows a synthetic user picks from on each iteration.
+FLOWS: dict[str, int] = {
+    "browse": 5,
+    "buy": 2,
+    "add_card": 2,
+    "withdraw": 1,
+    "start": 1,
+}
+
+
+def pick_flow(user: SyntheticUser) -> Callable[[], Awaitable[None]]:
+    name = random.choices(list(FLOWS), weights=list(FLOWS.values()))[0]
+    return getattr(user, name)
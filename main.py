@@ -1,10 +1,28 @@
 import asyncio
+from typing import Optional
+
+import redis.asyncio as redis
 from aiogram import Dispatcher
 from aiogram.types import BotCommand
 
+from core.config import settings
+from core.fsm import BufferedRedisStorage
 from core.metrics import start_metrics_server
 from core.metrics_loader import preload_metrics
-from core.middleware import CallbackStateMiddleware
+from core.middleware import (
+    CallbackStateMiddleware,
+    ErrorsMiddleware,
+    FSMWriteBufferMiddleware,
+    HandlerMetricsMiddleware,
+    StreamIngestMiddleware,
+    UnitOfWorkMiddleware,
+    UpdateRecordMiddleware,
+    UserMiddleware,
+)
+from core.recorder import UpdateRecorder, open_recorder
+from core.scheduler import SchedulingDispatcher, UpdateScheduler
+from core.streams import StreamWorker, UpdateIngest, WorkerPool, consumer_name, worker_shards
+from core.webhook import run_webhook
 from misc import BotLogger
 from routers import router_head as main_router
 import core.di as di
@@ -12,27 +30,171 @@ import core.di as di
 logger = BotLogger.get_logger("bot")
 
 
-async def bot_runner():
-    await di.init()
-    logger.info("Глобальные сервисы инициализированы")
+def attach_recorder(dispatcher: Dispatcher, recorder: UpdateRecorder) -> None:
+    # aiogram registers its FSM middleware in the constructor; the recorder goes in
+    # front of it so an update is kept even when the FSM read fails.
+    fsm_registered = dispatcher.fsm in dispatcher.update.outer_middleware
+    if fsm_registered:
+        dispatcher.update.outer_middleware.unregister(dispatcher.fsm)
+    dispatcher.update.outer_middleware(UpdateRecordMiddleware(recorder))
+    if fsm_registered:
+        dispatcher.update.outer_middleware(dispatcher.fsm)
 
-    start_metrics_server()
-    await preload_metrics()
 
-    dispatcher = Dispatcher()
+def build_dispatcher(recorder: Optional[UpdateRecorder] = None) -> Dispatcher:
+    fsm_storage = BufferedRedisStorage.from_url(settings.redis_url, ttl=settings.fsm_ttl)
+    scheduler = UpdateScheduler(
+        max_concurrency=settings.update_concurrency,
+        user_queue_size=settings.update_user_queue_size,
+        max_pending=settings.update_max_pending,
+    )
+    dispatcher = SchedulingDispatcher(scheduler=scheduler, storage=fsm_storage)
+    if recorder is not None:
+        attach_recorder(dispatcher, recorder)
+    # Counts every update that fails, including in the middlewares before the handler.
+    dispatcher.update.outer_middleware(ErrorsMiddleware())
+    dispatcher.update.outer_middleware(FSMWriteBufferMiddleware(fsm_storage))
 
+    main_router.message.outer_middleware(UserMiddleware(di.repo))
+    main_router.callback_query.outer_middleware(UserMiddleware(di.repo))
+    main_router.message.middleware(HandlerMetricsMiddleware())
+    main_router.callback_query.middleware(HandlerMetricsMiddleware())
     main_router.callback_query.middleware(CallbackStateMiddleware())
+    main_router.message.middleware(UnitOfWorkMiddleware(di.db.async_sessionmaker))
+    main_router.callback_query.middleware(UnitOfWorkMiddleware(di.db.async_sessionmaker))
 
     if not getattr(main_router, "_is_attached", False):
         dispatcher.include_router(main_router)
         main_router._is_attached = True
 
-    if di.bot:
-        await di.bot.set_my_commands(
-            [BotCommand(command="start", description="Главное меню")]
+    return dispatcher
+
+
+async def receive_updates(
+    dispatcher: Dispatcher,
+    allowed_updates: Optional[list[str]] = None,
+    handle_concurrently: bool = True,
+) -> None:
+    if settings.bot_transport == "webhook":
+        await run_webhook(
+            dispatcher,
+            di.bot,
+            host=settings.webhook_host,
+            port=settings.webhook_port,
+            path=settings.webhook_path,
+            base_url=settings.webhook_base_url,
+            secret_token=settings.webhook_secret,
+            allowed_updates=allowed_updates,
+            handle_in_background=handle_concurrently,
+        )
+    else:
+        await di.bot.delete_webhook(drop_pending_updates=False)
+        await dispatcher.start_polling(
+            di.bot,
+            allowed_updates=allowed_updates or dispatcher.resolve_used_update_types(),
+            handle_as_tasks=handle_concurrently,
         )
 
-    await dispatcher.start_polling(di.bot)
+
+def bot_api_share() -> float:
+    if settings.bot_mode != "sharded":
+        return 1.0
+    return 1 / (settings.stream_node_count * (settings.stream_workers + 1))
+
+
+async def stop_tasks(tasks: list[asyncio.Task]) -> None:
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def bot_runner():
+    await di.init(bot_api_share())
+    logger.info("Глобальные сервисы инициализированы")
+
+    start_metrics_server(settings.metrics_port)
+    await preload_metrics()
+
+    background = [
+        asyncio.create_task(di.roles.run_refresher()),
+        asyncio.create_task(di.approved_counter.run_reconciler()),
+        asyncio.create_task(di.ledger.run_folder()),
+        asyncio.create_task(di.outbox.run()),
+        asyncio.create_task(di.broadcasts.resume()),
+    ]
+    recorder = None
+    try:
+        if di.bot:
+            await di.bot.set_my_commands(
+                [BotCommand(command="start", description="Главное меню")]
+            )
+
+        recorder = open_recorder(settings.update_record_path, settings.update_record_salt)
+        if settings.bot_mode == "sharded":
+            await run_ingest(recorder)
+        else:
+            await receive_updates(build_dispatcher(recorder))
+    finally:
+        await stop_tasks(background)
+        if recorder is not None:
+            recorder.close()
+
+
+async def run_ingest(recorder: Optional[UpdateRecorder] = None):
+    # This process only receives updates and appends them to Redis Streams,
+    # in arrival order; the routers run in the worker processes.
+    pool = WorkerPool(worker_main, settings.stream_workers, node_index=settings.stream_node_index)
+    pool.start()
+    supervisor = asyncio.create_task(pool.supervise())
+
+    ingest = UpdateIngest(redis.from_url(settings.redis_url), settings.stream_shards, settings.stream_maxlen)
+    dispatcher = Dispatcher(disable_fsm=True)
+    if recorder is not None:
+        attach_recorder(dispatcher, recorder)
+    dispatcher.update.outer_middleware(StreamIngestMiddleware(ingest))
+    try:
+        await receive_updates(
+            dispatcher,
+            allowed_updates=main_router.resolve_used_update_types(),
+            handle_concurrently=False,
+        )
+    finally:
+        supervisor.cancel()
+        pool.stop()
+        await ingest.close()
+
+
+async def worker_runner(global_index: int):
+    await di.init(bot_api_share())
+    local_index = global_index - settings.stream_node_index * settings.stream_workers
+    start_metrics_server(settings.metrics_port + 1 + local_index)
+
+    background = [asyncio.create_task(di.roles.run_refresher())]
+
+    total_workers = settings.stream_workers * settings.stream_node_count
+    worker = StreamWorker(
+        redis.from_url(settings.redis_url),
+        build_dispatcher(),
+        di.bot,
+        shards=worker_shards(global_index, total_workers, settings.stream_shards),
+        consumer=consumer_name(global_index),
+        batch_size=settings.stream_batch_size,
+        max_in_flight=settings.stream_max_in_flight,
+    )
+    try:
+        await worker.run()
+    finally:
+        await stop_tasks(background)
+
+
+def worker_main(global_index: int):
+    try:
+        asyncio.run(worker_runner(global_index))
+    except KeyboardInterrupt:
+        pass
+    except Exception:
+        logger.exception(f"Ошибка в воркере {global_index}")
+        raise
 
 
 def main():
@@ -5,7 +5,7 @@ from aiogram import Router, F
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, Message, BufferedInputFile
 
-from core.notifier import safe_notify
+from core.outbox import enqueue
 from core.database import (
     Card,
     CardStatus,
@@ -16,13 +16,15 @@ from core.database import (
 from core.metrics import users_total, cards_total
 import core.di as di
 from core.filters import AdminFilter
-from core.states import AdminEditCardStates
+from core.states import AdminBroadcastStates, AdminEditCardStates
+from core.uow import UnitOfWork
 from core.utils import Utils
 from misc import BotLogger
 from template.markup import Markups
 from template.message import Messages
 
-from sqlalchemy import select
+from sqlalchemy import Row, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 import io
@@ -41,43 +43,43 @@ async def admin_menu(callback: CallbackQuery, state: FSMContext) -> None:
 
 @admin_router.callback_query(F.data == "admin-back-0")
 async def admin_back(callback: CallbackQuery, state: FSMContext) -> None:
-    if di.repo is None:
-        logger.error("Repository is not initialized")
-        return
-    user = await di.repo.get_user_by_telegram_id(callback.from_user.id)
-    is_admin = bool(user and user.is_admin)
     from template.message import Messages as Msgs
     from template.markup import Markups as Mk
     await Utils.answer(
         callback,
         Msgs.start(callback.from_user.first_name),
-        markup=Mk.start_menu(is_admin=is_admin),
+        markup=Mk.start_menu(is_admin=Utils.is_admin(callback.from_user.id)),
     )
 
 
-async def _fetch_pending_card_with_neighbors(offset: int) -> tuple[Optional[Card], bool, bool]:
-    if di.db is None:
-        return None, False, False
-    async with di.db.async_sessionmaker() as session:
-        result = await session.execute(
-            select(Card)
-            .where(Card.status == CardStatus.pending)
-            .order_by(Card.id)
-            .offset(offset)
-            .limit(2)
-            .options(selectinload(Card.owner))
-        )
-        cards = result.scalars().all()
-        if not cards:
-            return None, False, False
-        card = cards[0]
-        has_prev = offset > 0
-        has_next = len(cards) > 1
-        return card, has_prev, has_next
-
-
-async def _show_moderation_card(target: CallbackQuery | Message, offset: int, edit: bool) -> None:
-    card, has_prev, has_next = await _fetch_pending_card_with_neighbors(offset)
+async def _fetch_pending_card_with_neighbors(
+    uow: UnitOfWork,
+    offset: int,
+) -> tuple[Optional[Card], Optional[User], bool, bool]:
+    if di.db is None or di.repo is None:
+        return None, None, False, False
+    session = await uow.session()
+    result = await session.execute(
+        select(Card)
+        .where(Card.status == CardStatus.pending)
+        .order_by(Card.id)
+        .offset(offset)
+        .limit(2)
+    )
+    cards = result.scalars().all()
+    if not cards:
+        return None, None, False, False
+    owners = await di.repo.get_many_by_ids(User, [c.owner_id for c in cards], uow=uow)
+    card = cards[0]
+    has_prev = offset > 0
+    has_next = len(cards) > 1
+    return card, owners.get(card.owner_id), has_prev, has_next
+
+
+async def _show_moderation_card(target: CallbackQuery | Message, uow: UnitOfWork, offset: int, edit: bool) -> None:
+    card, owner, has_prev, has_next = await _fetch_pending_card_with_neighbors(uow, offset)
+    # Release the connection before the Telegram calls below.
+    await uow.commit()
     if not card:
         await Utils.answer(
             target,
@@ -97,7 +99,7 @@ async def _show_moderation_card(target: CallbackQuery | Message, offset: int, ed
         card_title=card.title,
         card_description=card.description,
         price=card.price,
-        owner_username=card.owner.username if card.owner else None,
+        owner_username=owner.username if owner else None,
         show_owner=True,
     )
 
@@ -105,34 +107,55 @@ async def _show_moderation_card(target: CallbackQuery | Message, offset: int, ed
 
 
 @admin_router.callback_query(F.data == "admin-moderation-0")
-async def moderation_start(callback: CallbackQuery, state: FSMContext) -> None:
-    await _show_moderation_card(callback, offset=0, edit=False)
+async def moderation_start(callback: CallbackQuery, state: FSMContext, uow: UnitOfWork) -> None:
+    await _show_moderation_card(callback, uow, offset=0, edit=False)
 
 
 @admin_router.callback_query(F.data.startswith("admin-mod_prev-"))
-async def moderation_prev(callback: CallbackQuery, state: FSMContext) -> None:
+async def moderation_prev(callback: CallbackQuery, state: FSMContext, uow: UnitOfWork) -> None:
     parts = callback.data.split("-")
     try:
         offset = int(parts[2])
     except (IndexError, ValueError):
         offset = 0
     new_offset = max(offset - 1, 0)
-    await _show_moderation_card(callback, offset=new_offset, edit=True)
+    await _show_moderation_card(callback, uow, offset=new_offset, edit=True)
 
 
 @admin_router.callback_query(F.data.startswith("admin-mod_next-"))
-async def moderation_next(callback: CallbackQuery, state: FSMContext) -> None:
+async def moderation_next(callback: CallbackQuery, state: FSMContext, uow: UnitOfWork) -> None:
     parts = callback.data.split("-")
     try:
         offset = int(parts[2])
     except (IndexError, ValueError):
         offset = 0
     new_offset = max(offset + 1, 0)
-    await _show_moderation_card(callback, offset=new_offset, edit=True)
+    await _show_moderation_card(callback, uow, offset=new_offset, edit=True)
+
+
+async def _moderate(session: AsyncSession, card_id: int, status: CardStatus) -> Optional[Row]:
+    # The status guard in the UPDATE itself: of two admins deciding the same card at
+    # once, only one gets a row back, so the counter and the owner hear about it once.
+    result = await session.execute(
+        update(Card)
+        .where(Card.id == card_id, Card.status == CardStatus.pending)
+        .values(status=status, updated_at=datetime.now(timezone.utc))
+        .returning(
+            Card.title,
+            select(User.telegram_id).where(User.id == Card.owner_id).scalar_subquery().label("owner_telegram_id"),
+        )
+    )
+    return result.first()
+
+
+async def _moderation_failure(session: AsyncSession, card_id: int) -> str:
+    if await session.scalar(select(Card.id).where(Card.id == card_id)) is None:
+        return "Карточка не найдена."
+    return "Карточка уже промодерирована."
 
 
 @admin_router.callback_query(F.data.startswith("admin-modapprove-"))
-async def moderation_approve(callback: CallbackQuery, state: FSMContext) -> None:
+async def moderation_approve(callback: CallbackQuery, state: FSMContext, uow: UnitOfWork) -> None:
     parts = callback.data.split("-")
     try:
         card_id = int(parts[2])
@@ -144,34 +167,21 @@ async def moderation_approve(callback: CallbackQuery, state: FSMContext) -> None
         logger.error("DB is not initialized")
         return
 
-    async with di.db.async_sessionmaker() as session:
-        result = await session.execute(
-            select(Card)
-            .options(selectinload(Card.owner))
-            .where(Card.id == card_id)
-        )
-        card: Card | None = result.scalars().first()
-
-        if not card:
-            await callback.answer("Карточка не найдена.")
-            return
-
-        if card.status != CardStatus.pending:
-            await callback.answer("Карточка уже промодерирована.")
-            return
-
-        card.status = CardStatus.approved
-        card.updated_at = datetime.now(timezone.utc)
-        await session.commit()
-
-        logger.info("Карточка %s одобрена", card_id)
+    session = await uow.session()
+    card = await _moderate(session, card_id, CardStatus.approved)
+    if card is None:
+        failure = await _moderation_failure(session, card_id)
+        await uow.rollback()
+        await callback.answer(failure)
+        return
 
-        if card.owner:
-            await safe_notify(
-                callback.message.bot,
-                card.owner.telegram_id,
-                f"✅ Ваша карточка «{card.title}» была одобрена и добавлена в каталог!",
-            )
+    enqueue(session, card.owner_telegram_id, Messages.card_approved(card.title))
+    if di.approved_counter:
+        uow.on_commit(di.approved_counter.incr)
+    if di.outbox:
+        uow.on_commit(di.outbox.wake)
+    await uow.commit()
+    logger.info("Карточка %s одобрена", card_id)
 
     try:
         await callback.message.edit_reply_markup(
@@ -180,12 +190,12 @@ async def moderation_approve(callback: CallbackQuery, state: FSMContext) -> None
     except Exception as e:
         logger.error(f"Failed to edit moderation keyboard: {e}")
 
-    await _show_moderation_card(callback, offset=0, edit=False)
+    await _show_moderation_card(callback, uow, offset=0, edit=False)
     await callback.answer("Карточка одобрена.", show_alert=True)
 
 
 @admin_router.callback_query(F.data.startswith("admin-modreject-"))
-async def moderation_reject(callback: CallbackQuery, state: FSMContext) -> None:
+async def moderation_reject(callback: CallbackQuery, state: FSMContext, uow: UnitOfWork) -> None:
     parts = callback.data.split("-")
     try:
         card_id = int(parts[2])
@@ -197,34 +207,19 @@ async def moderation_reject(callback: CallbackQuery, state: FSMContext) -> None:
         logger.error("DB is not initialized")
         return
 
-    async with di.db.async_sessionmaker() as session:
-        result = await session.execute(
-            select(Card)
-            .options(selectinload(Card.owner))
-            .where(Card.id == card_id)
-        )
-        card: Card | None = result.scalars().first()
-
-        if not card:
-            await callback.answer("Карточка не найдена.")
-            return
-
-        if card.status != CardStatus.pending:
-            await callback.answer("Карточка уже промодерирована.")
-            return
-
-        card.status = CardStatus.rejected
-        card.updated_at = datetime.now(timezone.utc)
-        await session.commit()
-
-        logger.info("Карточка %s отклонена", card_id)
+    session = await uow.session()
+    card = await _moderate(session, card_id, CardStatus.rejected)
+    if card is None:
+        failure = await _moderation_failure(session, card_id)
+        await uow.rollback()
+        await callback.answer(failure)
+        return
 
-        if card.owner:
-            await safe_notify(
-                callback.message.bot,
-                card.owner.telegram_id,
-                f"❌ Ваша карточка «{card.title}» была отклонена модерацией.",
-            )
+    enqueue(session, card.owner_telegram_id, Messages.card_rejected(card.title))
+    if di.outbox:
+        uow.on_commit(di.outbox.wake)
+    await uow.commit()
+    logger.info("Карточка %s отклонена", card_id)
 
     try:
         await callback.message.edit_reply_markup(
@@ -233,7 +228,7 @@ async def moderation_reject(callback: CallbackQuery, state: FSMContext) -> None:
     except Exception as e:
         logger.error(f"Failed to edit moderation keyboard: {e}")
 
-    await _show_moderation_card(callback, offset=0, edit=False)
+    await _show_moderation_card(callback, uow, offset=0, edit=False)
     await callback.answer("Карточка отклонена.", show_alert=True)
 
 
@@ -422,29 +417,34 @@ async def admin_stats(callback: CallbackQuery, state: FSMContext) -> None:
     logger.info("Статистика выгружена в XLSX")
 
 
-async def _fetch_withdraw_with_neighbors(offset: int) -> tuple[Optional[WithdrawRequest], bool, bool]:
-    if di.db is None:
-        return None, False, False
-    async with di.db.async_sessionmaker() as session:
-        result = await session.execute(
-            select(WithdrawRequest)
-            .where(WithdrawRequest.status == WithdrawStatus.pending)
-            .order_by(WithdrawRequest.id)
-            .offset(offset)
-            .limit(2)
-            .options(selectinload(WithdrawRequest.user))
-        )
-        withdraws = result.scalars().all()
-        if not withdraws:
-            return None, False, False
-        w = withdraws[0]
-        has_prev = offset > 0
-        has_next = len(withdraws) > 1
-        return w, has_prev, has_next
-
-
-async def _show_withdraw(callback: CallbackQuery, offset: int, edit: bool) -> None:
-    w, has_prev, has_next = await _fetch_withdraw_with_neighbors(offset)
+async def _fetch_withdraw_with_neighbors(
+    uow: UnitOfWork,
+    offset: int,
+) -> tuple[Optional[WithdrawRequest], Optional[User], bool, bool]:
+    if di.db is None or di.repo is None:
+        return None, None, False, False
+    session = await uow.session()
+    result = await session.execute(
+        select(WithdrawRequest)
+        .where(WithdrawRequest.status == WithdrawStatus.pending)
+        .order_by(WithdrawRequest.id)
+        .offset(offset)
+        .limit(2)
+    )
+    withdraws = result.scalars().all()
+    if not withdraws:
+        return None, None, False, False
+    users = await di.repo.get_many_by_ids(User, [w.user_id for w in withdraws], uow=uow)
+    w = withdraws[0]
+    has_prev = offset > 0
+    has_next = len(withdraws) > 1
+    return w, users.get(w.user_id), has_prev, has_next
+
+
+async def _show_withdraw(callback: CallbackQuery, uow: UnitOfWork, offset: int, edit: bool) -> None:
+    w, user, has_prev, has_next = await _fetch_withdraw_with_neighbors(uow, offset)
+    # Release the connection before the Telegram calls below.
+    await uow.commit()
     if not w:
         await Utils.answer(
             callback,
@@ -461,7 +461,7 @@ async def _show_withdraw(callback: CallbackQuery, offset: int, edit: bool) -> No
         request=w,
     )
     text = Messages.withdraw_request_text(
-        username=w.user.username if w.user else None,
+        username=user.username if user else None,
         amount=w.amount,
         requisites=w.requisites,
     )
@@ -470,34 +470,34 @@ async def _show_withdraw(callback: CallbackQuery, offset: int, edit: bool) -> No
 
 
 @admin_router.callback_query(F.data == "admin-withdraws-0")
-async def admin_withdraws_start(callback: CallbackQuery, state: FSMContext) -> None:
-    await _show_withdraw(callback, offset=0, edit=False)
+async def admin_withdraws_start(callback: CallbackQuery, state: FSMContext, uow: UnitOfWork) -> None:
+    await _show_withdraw(callback, uow, offset=0, edit=False)
 
 
 @admin_router.callback_query(F.data.startswith("admin-wd_prev-"))
-async def admin_withdraws_prev(callback: CallbackQuery, state: FSMContext) -> None:
+async def admin_withdraws_prev(callback: CallbackQuery, state: FSMContext, uow: UnitOfWork) -> None:
     parts = callback.data.split("-")
     try:
         offset = int(parts[2])
     except (IndexError, ValueError):
         offset = 0
     new_offset = max(offset - 1, 0)
-    await _show_withdraw(callback, offset=new_offset, edit=True)
+    await _show_withdraw(callback, uow, offset=new_offset, edit=True)
 
 
 @admin_router.callback_query(F.data.startswith("admin-wd_next-"))
-async def admin_withdraws_next(callback: CallbackQuery, state: FSMContext) -> None:
+async def admin_withdraws_next(callback: CallbackQuery, state: FSMContext, uow: UnitOfWork) -> None:
     parts = callback.data.split("-")
     try:
         offset = int(parts[2])
     except (IndexError, ValueError):
         offset = 0
     new_offset = max(offset + 1, 0)
-    await _show_withdraw(callback, offset=new_offset, edit=True)
+    await _show_withdraw(callback, uow, offset=new_offset, edit=True)
 
 
 @admin_router.callback_query(F.data.startswith("admin-wdpaid-"))
-async def admin_withdraw_paid(callback: CallbackQuery, state: FSMContext) -> None:
+async def admin_withdraw_paid(callback: CallbackQuery, state: FSMContext, uow: UnitOfWork) -> None:
     parts = callback.data.split("-")
     try:
         req_id = int(parts[2])
@@ -509,34 +509,27 @@ async def admin_withdraw_paid(callback: CallbackQuery, state: FSMContext) -> Non
         logger.error("DB is not initialized")
         return
 
-    async with di.db.async_sessionmaker() as session:
-        result = await session.execute(
-            select(WithdrawRequest)
-            .options(selectinload(WithdrawRequest.user))
-            .where(WithdrawRequest.id == req_id)
-        )
-        w: WithdrawRequest | None = result.scalars().first()
-
-        if not w:
-            await callback.answer("Заявка не найдена.")
-            return
-
-        if w.status != WithdrawStatus.pending:
-            await callback.answer("Заявка уже обработана.")
-            return
-
-        w.status = WithdrawStatus.completed
-        w.updated_at = datetime.now(timezone.utc)
-        await session.commit()
+    session = await uow.session()
+    result = await session.execute(
+        select(WithdrawRequest)
+        .options(selectinload(WithdrawRequest.user))
+        .where(WithdrawRequest.id == req_id)
+    )
+    w: WithdrawRequest | None = result.scalars().first()
 
-        logger.info("Заявка %s отмечена как выплаченная", req_id)
+    if not w or w.status != WithdrawStatus.pending:
+        await uow.rollback()
+        await callback.answer("Заявка не найдена." if not w else "Заявка уже обработана.")
+        return
 
-        if w.user:
-            await safe_notify(
-                callback.message.bot,
-                w.user.telegram_id,
-                f"💰 Ваша заявка на вывод {w.amount:.2f} была успешно выплачена!",
-            )
+    w.status = WithdrawStatus.completed
+    w.updated_at = datetime.now(timezone.utc)
+    if w.user:
+        enqueue(session, w.user.telegram_id, Messages.withdraw_paid(w.amount))
+    if di.outbox:
+        uow.on_commit(di.outbox.wake)
+    await uow.commit()
+    logger.info("Заявка %s отмечена как выплаченная", req_id)
 
     try:
         await callback.message.edit_reply_markup(
@@ -545,5 +538,45 @@ async def admin_withdraw_paid(callback: CallbackQuery, state: FSMContext) -> Non
     except Exception as e:
         logger.error(f"Failed to edit withdraw keyboard: {e}")
 
-    await _show_withdraw(callback, offset=0, edit=False)
+    await _show_withdraw(callback, uow, offset=0, edit=False)
     await callback.answer("Выплата отмечена как проведённая.", show_alert=True)
+
+
+@admin_router.callback_query(F.data == "admin-broadcast-0")
+async def admin_broadcast_start(callback: CallbackQuery, state: FSMContext) -> None:
+    if di.broadcasts is None:
+        logger.error("Broadcast engine is not initialized")
+        return
+
+    if await di.broadcasts.is_running():
+        await callback.answer(Messages.broadcast_busy(), show_alert=True)
+        return
+
+    await state.set_state(AdminBroadcastStates.waiting_text)
+    await Utils.answer(callback, Messages.ask_broadcast_text(), markup=Markups.cancel_reply_kb())
+
+
+@admin_router.message(AdminBroadcastStates.waiting_text)
+async def admin_broadcast_text(message: Message, state: FSMContext) -> None:
+    if message.text == "Отмена":
+        await state.clear()
+        await message.answer("Рассылка отменена.", reply_markup=Markups.remove_reply_kb())
+        return
+
+    if not message.text:
+        await message.answer("Нужно отправить текст.")
+        return
+
+    if di.broadcasts is None:
+        logger.error("Broadcast engine is not initialized")
+        return
+
+    await state.clear()
+    await message.answer(Messages.broadcast_started(), reply_markup=Markups.remove_reply_kb())
+    progress = await message.answer(Messages.broadcast_progress(0, 0, 0, False))
+    broadcast_id = await di.broadcasts.start(message.html_text, message.chat.id, progress.message_id)
+    if broadcast_id is None:
+        await message.answer(Messages.broadcast_busy())
+        return
+
+    logger.info("Рассылка %s запущена администратором %s", broadcast_id, message.from_user.id)
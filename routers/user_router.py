@@ -1,14 +1,23 @@
 from datetime import datetime, timezone
 from typing import Optional
-from core.notifier import safe_notify
 from aiogram import Router, F
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, Message, InputMediaPhoto
-from sqlalchemy import func, select
-from sqlalchemy.orm import selectinload
-from core.database import Card, CardStatus, User, Purchase, WithdrawRequest, WithdrawStatus
+from sqlalchemy import select
+from core.database import (
+    BalanceLedgerEntry,
+    Card,
+    CardStatus,
+    LedgerEntryKind,
+    User,
+    WithdrawRequest,
+    WithdrawStatus,
+)
 import core.di as di
+from core.ledger import available_balance, lock_user
+from core.purchases import PurchaseStatus
 from core.states import AddCardStates, WithdrawStates
+from core.uow import UnitOfWork
 from core.utils import Utils
 from misc import BotLogger
 from template.markup import Markups
@@ -20,35 +29,25 @@ logger = BotLogger.get_logger(__name__)
 
 
 async def _get_total_approved():
-    async with di.db.async_sessionmaker() as session:
-        result = await session.execute(
-            select(func.count(Card.id)).where(Card.status == CardStatus.approved)
-        )
-        return result.scalar() or 0
+    if di.approved_counter is None:
+        return 0
+    return await di.approved_counter.get()
 
 
 async def _go_main_menu_from_callback(callback: CallbackQuery) -> None:
-    if di.repo is None:
-        return
-    user = await di.repo.get_user_by_telegram_id(callback.from_user.id)
-    is_admin = bool(user and user.is_admin)
     await Utils.answer(
         callback,
         Messages.start(callback.from_user.first_name),
-        markup=Markups.start_menu(is_admin=is_admin),
+        markup=Markups.start_menu(is_admin=Utils.is_admin(callback.from_user.id)),
         edit_it=False,
     )
 
 
 async def _go_main_menu_from_message(message: Message) -> None:
-    if di.repo is None:
-        return
-    user = await di.repo.get_user_by_telegram_id(message.from_user.id)
-    is_admin = bool(user and user.is_admin)
     await Utils.answer(
         message,
         Messages.start(message.from_user.first_name),
-        markup=Markups.start_menu(is_admin=is_admin),
+        markup=Markups.start_menu(is_admin=Utils.is_admin(message.from_user.id)),
         edit_it=False,
     )
 
@@ -108,7 +107,7 @@ async def add_card_price(message: Message, state: FSMContext) -> None:
 
 
 @user_router.message(AddCardStates.waiting_photo)
-async def add_card_photo(message: Message, state: FSMContext) -> None:
+async def add_card_photo(message: Message, state: FSMContext, user: User, uow: UnitOfWork) -> None:
     if message.text == "Отмена":
         await state.clear()
         await Utils.answer(message, "Добавление карточки отменено.")
@@ -124,17 +123,6 @@ async def add_card_photo(message: Message, state: FSMContext) -> None:
     if di.repo is None:
         return
 
-    user = await di.repo.get_user_by_telegram_id(message.from_user.id)
-    if not user:
-        user = await di.repo.upsert(
-            User(
-                telegram_id=message.from_user.id,
-                username=message.from_user.username,
-                created_at=datetime.now(timezone.utc),
-                updated_at=datetime.now(timezone.utc),
-            )
-        )
-
     card = Card(
         owner_id=user.id,
         title=title,
@@ -145,7 +133,8 @@ async def add_card_photo(message: Message, state: FSMContext) -> None:
         created_at=datetime.now(timezone.utc),
         updated_at=datetime.now(timezone.utc),
     )
-    await di.repo.upsert(card)
+    await di.repo.upsert(card, uow=uow)
+    await uow.commit()
 
     cards_total.inc()
 
@@ -154,54 +143,75 @@ async def add_card_photo(message: Message, state: FSMContext) -> None:
     await _go_main_menu_from_message(message)
 
 
-async def _fetch_approved_card_with_neighbors(offset: int):
-    if di.db is None:
-        return None, False, False
-    async with di.db.async_sessionmaker() as session:
-        result = await session.execute(
-            select(Card)
-            .options(selectinload(Card.owner))
-            .where(Card.status == CardStatus.approved)
-            .order_by(Card.id)
-            .offset(offset)
-            .limit(2)
-        )
-        cards = result.scalars().all()
-        if not cards:
-            return None, False, False
-        return cards[0], offset > 0, len(cards) > 1
+async def _fetch_approved_card_with_neighbors(uow: UnitOfWork, cursor: int, backward: bool = False):
+    if di.db is None or di.repo is None:
+        return None, None, False, False
+
+    query = (
+        select(Card)
+        .where(Card.status == CardStatus.approved)
+        .limit(2)
+    )
+    if backward:
+        query = query.where(Card.id < cursor).order_by(Card.id.desc())
+    else:
+        query = query.where(Card.id > cursor).order_by(Card.id)
+
+    session = await uow.session()
+    result = await session.execute(query)
+    cards = result.scalars().all()
+    if not cards:
+        return None, None, False, False
+
+    # Owners of both the shown card and the look-ahead one come from the cache in one
+    # round trip, so the next page flip usually finds its owner already cached.
+    owners = await di.repo.get_many_by_ids(User, [c.owner_id for c in cards], uow=uow)
+    owner = owners.get(cards[0].owner_id)
+    if backward:
+        return cards[0], owner, len(cards) > 1, True
+    return cards[0], owner, cursor > 0, len(cards) > 1
+
+
+def _parse_cursor(data: str) -> tuple[int, int]:
+    parts = data.split("-")
+    try:
+        return int(parts[2]), int(parts[3])
+    except (IndexError, ValueError):
+        return 0, 0
 
 
 @user_router.callback_query(F.data == "user-show_products-0")
-async def show_cards_start(callback: CallbackQuery, state: FSMContext) -> None:
-    await _show_card(callback, offset=0, edit=False)
+async def show_cards_start(callback: CallbackQuery, state: FSMContext, uow: UnitOfWork) -> None:
+    await _show_card(callback, uow, cursor=0, position=1, edit=False)
 
 
 @user_router.callback_query(F.data.startswith("user-cards_prev-"))
-async def show_cards_prev(callback: CallbackQuery, state: FSMContext) -> None:
-    offset = int(callback.data.split("-")[2])
-    await _show_card(callback, offset=max(offset - 1, 0), edit=True)
+async def show_cards_prev(callback: CallbackQuery, state: FSMContext, uow: UnitOfWork) -> None:
+    cursor, position = _parse_cursor(callback.data)
+    await _show_card(callback, uow, cursor=cursor, position=max(position - 1, 1), edit=True, backward=True)
 
 
 @user_router.callback_query(F.data.startswith("user-cards_next-"))
-async def show_cards_next(callback: CallbackQuery, state: FSMContext) -> None:
-    offset = int(callback.data.split("-")[2])
-    await _show_card(callback, offset=max(offset + 1, 0), edit=True)
+async def show_cards_next(callback: CallbackQuery, state: FSMContext, uow: UnitOfWork) -> None:
+    cursor, position = _parse_cursor(callback.data)
+    await _show_card(callback, uow, cursor=cursor, position=position + 1, edit=True)
 
 
-async def _show_card(cb_or_msg, offset: int, edit: bool):
-    card, has_prev, has_next = await _fetch_approved_card_with_neighbors(offset)
+async def _show_card(cb_or_msg, uow: UnitOfWork, cursor: int, position: int, edit: bool, backward: bool = False):
+    card, owner, has_prev, has_next = await _fetch_approved_card_with_neighbors(uow, cursor, backward)
+    # Release the connection before the Telegram calls below.
+    await uow.commit()
     if not card:
         return await Utils.answer(cb_or_msg, Messages.no_cards_available())
 
     total_cards = await _get_total_approved()
-    kb = Markups.user_cards_keyboard(offset, has_prev, has_next, card, total_cards)
+    kb = Markups.user_cards_keyboard(position, has_prev, has_next, card, total_cards)
     text = Messages.format_card(
         card_title=card.title,
         card_description=card.description,
         price=card.price,
-        owner_username=card.owner.username if card.owner else None,
-        show_owner=(card.owner.telegram_id == cb_or_msg.from_user.id),
+        owner_username=owner.username if owner else None,
+        show_owner=bool(owner and owner.telegram_id == cb_or_msg.from_user.id),
     )
 
     if isinstance(cb_or_msg, CallbackQuery):
@@ -226,60 +236,35 @@ async def _show_card(cb_or_msg, offset: int, edit: bool):
 
 
 @user_router.callback_query(F.data.startswith("user-buy-"))
-async def buy_card(callback: CallbackQuery, state: FSMContext) -> None:
+async def buy_card(callback: CallbackQuery, state: FSMContext, user: User) -> None:
     card_id = int(callback.data.split("-")[2])
 
-    async with di.db.async_sessionmaker() as session:
-        result = await session.execute(
-            select(Card).options(selectinload(Card.owner)).where(Card.id == card_id)
-        )
-        card = result.scalars().first()
-
-        if not card or card.status != CardStatus.approved:
-            await callback.answer("Карточка недоступна.")
-            return
-        buyer_result = await session.execute(
-            select(User).where(User.telegram_id == callback.from_user.id)
-        )
-        buyer = buyer_result.scalars().first()
-
-        if not buyer:
-            return await Utils.answer(callback, "Ошибка: пользователь не найден.")
-
-        seller = card.owner
-        if not seller:
-            await Utils.answer(callback, "Ошибка: у карточки нет владельца.")
-            return
-        if seller.id == buyer.id:
-            await callback.answer("❌ Вы не можете купить свою карточку.", show_alert=True)
-            return
-        if (buyer.balance or 0.0) < card.price:
-            await callback.answer("❌ Недостаточно средств.", show_alert=True)
-            return
-        buyer.balance -= card.price
-        seller.balance = (seller.balance or 0.0) + card.price
-
-        purchase = Purchase(
-            buyer_id=buyer.id,
-            card_id=card.id,
-            amount=card.price,
-            created_at=datetime.now(timezone.utc),
-        )
-        session.add(purchase)
+    if di.purchases is None:
+        return
 
-        card.status = CardStatus.sold
-        card.updated_at = datetime.now(timezone.utc)
+    result = await di.purchases.buy(card_id, user.id, seller_notification=Messages.card_sold)
 
-        await session.commit()
+    if result.status == PurchaseStatus.card_unavailable:
+        await callback.answer("Карточка недоступна.")
+        return
+    if result.status == PurchaseStatus.buyer_not_found:
+        return await Utils.answer(callback, "Ошибка: пользователь не найден.")
+    if result.status == PurchaseStatus.own_card:
+        await callback.answer("❌ Вы не можете купить свою карточку.", show_alert=True)
+        return
+    if result.status == PurchaseStatus.insufficient_funds:
+        await callback.answer("❌ Недостаточно средств.", show_alert=True)
+        return
 
-        purchases_total.inc()
-        cards_total.dec()
+    await di.repo.invalidate(User, result.buyer_id)
+    await di.repo.invalidate(User, result.seller_id)
 
-        await safe_notify(
-            callback.message.bot,
-            seller.telegram_id,
-            f"💸 Ваш товар «{card.title}» куплен! На баланс начислено {card.price:.2f}."
-        )
+    purchases_total.inc()
+    cards_total.dec()
+    if di.approved_counter:
+        await di.approved_counter.decr()
+    if di.outbox:
+        di.outbox.wake()
 
     try:
         await callback.message.edit_reply_markup(
@@ -297,11 +282,9 @@ async def buy_card(callback: CallbackQuery, state: FSMContext) -> None:
 
 
 @user_router.callback_query(F.data == "user-balance-0")
-async def show_balance(callback: CallbackQuery, state: FSMContext) -> None:
-    if di.repo is None:
-        return
-    user = await di.repo.get_user_by_telegram_id(callback.from_user.id)
-    balance = user.balance if user else 0.0
+async def show_balance(callback: CallbackQuery, state: FSMContext, user: User, uow: UnitOfWork) -> None:
+    balance = await di.ledger.get_balance(user.id, uow=uow)
+    await uow.commit()
     await Utils.answer(
         callback,
         Messages.balance(balance),
@@ -311,27 +294,25 @@ async def show_balance(callback: CallbackQuery, state: FSMContext) -> None:
 
 
 @user_router.callback_query(F.data == "user-withdraw-0")
-async def withdraw_start(callback: CallbackQuery, state: FSMContext) -> None:
-    if di.repo is None:
-        return
-
-    user = await di.repo.get_user_by_telegram_id(callback.from_user.id)
-    if not user or not user.balance:
+async def withdraw_start(callback: CallbackQuery, state: FSMContext, user: User, uow: UnitOfWork) -> None:
+    balance = await di.ledger.get_balance(user.id, uow=uow)
+    await uow.commit()
+    if balance <= 0:
         await callback.answer("У вас нет средств.", show_alert=True)
         return
 
     await state.set_state(WithdrawStates.waiting_requisites)
-    await state.update_data(amount=user.balance)
+    await state.update_data(amount=balance)
 
     await Utils.answer(
         callback,
-        Messages.ask_withdraw_requisites(user.balance),
+        Messages.ask_withdraw_requisites(balance),
         markup=Markups.cancel_reply_kb(),
     )
 
 
 @user_router.message(WithdrawStates.waiting_requisites)
-async def withdraw_requisites(message: Message, state: FSMContext) -> None:
+async def withdraw_requisites(message: Message, state: FSMContext, user: User) -> None:
     if message.text == "Отмена":
         await state.clear()
         await Utils.answer(message, "Заявка отменена.", markup=Markups.remove_reply_kb())
@@ -344,20 +325,22 @@ async def withdraw_requisites(message: Message, state: FSMContext) -> None:
     amount = data["amount"]
     requisites = message.text.strip()
 
+    user_id = user.id
     async with di.db.async_sessionmaker() as session:
-        result = await session.execute(
-            select(User).where(User.telegram_id == message.from_user.id)
-        )
-        user = result.scalars().first()
-        if not user:
+        if not await lock_user(session, user_id):
             await state.clear()
             return await Utils.answer(message, "Пользователь не найден.", markup=Markups.remove_reply_kb())
 
-        if user.balance < amount:
-            amount = user.balance
+        balance = await session.scalar(select(available_balance(user_id))) or 0.0
+        if balance < amount:
+            amount = balance
+        if amount <= 0:
+            await session.rollback()
+            await state.clear()
+            return await Utils.answer(message, "У вас нет средств.", markup=Markups.remove_reply_kb())
 
         withdraw = WithdrawRequest(
-            user_id=user.id,
+            user_id=user_id,
             amount=amount,
             requisites=requisites,
             status=WithdrawStatus.pending,
@@ -365,12 +348,24 @@ async def withdraw_requisites(message: Message, state: FSMContext) -> None:
             updated_at=datetime.now(timezone.utc),
         )
         session.add(withdraw)
-
-        user.balance -= amount
+        await session.flush()
+
+        session.add(
+            BalanceLedgerEntry(
+                user_id=user_id,
+                amount=-amount,
+                kind=LedgerEntryKind.withdrawal,
+                reference_id=withdraw.id,
+                created_at=datetime.now(timezone.utc),
+            )
+        )
         await session.commit()
 
         withdraw_requests_total.inc()
 
+    if di.repo:
+        await di.repo.invalidate(User, user_id)
+
     await state.clear()
     await Utils.answer(message, Messages.withdraw_created(), markup=Markups.remove_reply_kb())
     await _go_main_menu_from_message(message)
@@ -54,29 +54,27 @@ class Markups:
         return ReplyKeyboardRemove()
 
     @staticmethod
-    def user_cards_keyboard(offset: int, has_prev: bool, has_next: bool, card,
+    def user_cards_keyboard(position: int, has_prev: bool, has_next: bool, card,
                             total_cards: int = None) -> InlineKeyboardMarkup:
         buttons = [[
             InlineKeyboardButton(text="🛒 Купить", callback_data=f"user-buy-{card.id}")
         ]]
 
-        current_page = offset + 1
-
         if total_cards:
-            pages_text = f"{current_page}/{total_cards}"
+            pages_text = f"{position}/{total_cards}"
         else:
-            pages_text = f"{current_page}"
+            pages_text = f"{position}"
 
         page_btn = InlineKeyboardButton(text=pages_text, callback_data="noop")
 
         left_btn = InlineKeyboardButton(
             text="◀",
-            callback_data=f"user-cards_prev-{offset}" if has_prev else "noop"
+            callback_data=f"user-cards_prev-{card.id}-{position}" if has_prev else "noop"
         )
 
         right_btn = InlineKeyboardButton(
             text="▶",
-            callback_data=f"user-cards_next-{offset}" if has_next else "noop"
+            callback_data=f"user-cards_next-{card.id}-{position}" if has_next else "noop"
         )
 
         buttons.append([left_btn, page_btn, right_btn])
@@ -103,6 +101,7 @@ class Markups:
                 [InlineKeyboardButton(text="Модерация", callback_data="admin-moderation-0")],
                 [InlineKeyboardButton(text="Статистика", callback_data="admin-stats-0")],
                 [InlineKeyboardButton(text="Заявки на вывод", callback_data="admin-withdraws-0")],
+                [InlineKeyboardButton(text="Рассылка", callback_data="admin-broadcast-0")],
                 [InlineKeyboardButton(text="Назад", callback_data="admin-back-0")],
             ]
         )
@@ -48,6 +48,22 @@ class Messages:
             f"👤 Продавец: {'@'+owner if show_owner else 'Скрыто'}\n"
         )
 
+    @staticmethod
+    def card_sold(card_title: str, price: float) -> str:
+        return f"💸 Ваш товар «{card_title}» куплен! На баланс начислено {price:.2f}."
+
+    @staticmethod
+    def card_approved(card_title: str) -> str:
+        return f"✅ Ваша карточка «{card_title}» была одобрена и добавлена в каталог!"
+
+    @staticmethod
+    def card_rejected(card_title: str) -> str:
+        return f"❌ Ваша карточка «{card_title}» была отклонена модерацией."
+
+    @staticmethod
+    def withdraw_paid(amount: float) -> str:
+        return f"💰 Ваша заявка на вывод {amount:.2f} была успешно выплачена!"
+
     @staticmethod
     def balance(balance: float) -> str:
         return f"💰 Ваш баланс: <b>{balance:.2f}</b>"
@@ -75,6 +91,27 @@ class Messages:
     def withdraws_empty() -> str:
         return "Нет заявок на вывод."
 
+    @staticmethod
+    def ask_broadcast_text() -> str:
+        return "📣 Отправьте текст рассылки. Он будет доставлен всем пользователям."
+
+    @staticmethod
+    def broadcast_started() -> str:
+        return "📣 Рассылка запущена. Прогресс будет обновляться ниже."
+
+    @staticmethod
+    def broadcast_busy() -> str:
+        return "Рассылка уже идёт. Дождитесь её завершения."
+
+    @staticmethod
+    def broadcast_progress(sent: int, failed: int, total: int, finished: bool) -> str:
+        header = "✅ Рассылка завершена" if finished else "📣 Рассылка идёт..."
+        return (
+            f"{header}\n"
+            f"Доставлено: <b>{sent}</b> из {total}\n"
+            f"Не доставлено: {failed}"
+        )
+
     @staticmethod
     def moderation_card_header() -> str:
         return "Карточка на модерации:"